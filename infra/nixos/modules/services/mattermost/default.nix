@@ -41,7 +41,19 @@ let
     then ""
     else toString openIdSecretFile;
 
-  gitlabSettingsJSON = builtins.toJSON {
+  # Render a Nix value as a Python literal so generated scripts embed their
+  # defaults as constants instead of parsing JSON at runtime. JSON number and
+  # string syntax is already valid Python; only booleans and null differ.
+  toPythonLiteral = value:
+    if builtins.isBool value then (if value then "True" else "False")
+    else if value == null then "None"
+    else if builtins.isAttrs value then
+      "{" + lib.concatStringsSep ", " (lib.mapAttrsToList (name: v: "${builtins.toJSON name}: ${toPythonLiteral v}") value) + "}"
+    else if builtins.isList value then
+      "[" + lib.concatMapStringsSep ", " toPythonLiteral value + "]"
+    else builtins.toJSON value;
+
+  gitlabSettings = {
     Enable = cfg.gitlab.enable;
     EnableSync = true;
     AuthEndpoint = "${cfg.gitlab.baseUrl}/oauth/authorize";
@@ -51,8 +63,9 @@ let
     Scope = cfg.gitlab.oauthScopes;
     SkipTLSVerification = true;
   };
+  gitlabSettingsJSON = builtins.toJSON gitlabSettings;
 
-  openIdSettingsJSON = builtins.toJSON {
+  openIdSettings = {
     Enable = cfg.openid.enable;
     Id = cfg.openid.clientId;
     Secret = cfg.openid.clientSecretFallback;
@@ -64,6 +77,7 @@ let
     ButtonText = cfg.openid.buttonText;
     ButtonColor = cfg.openid.buttonColor;
   };
+  openIdSettingsJSON = builtins.toJSON openIdSettings;
 
   envFilePath =
     if cfg.envFile != null then cfg.envFile else
@@ -109,10 +123,10 @@ ${builtins.readFile "${mattermostScriptsDir}/ensure-gitlab-mattermost-ci.py"}
       [ "@SITE_URL@" "@BRAND_TEXT@" "@GITLAB_SETTINGS@" "@GITLAB_SECRET_FALLBACK@" "@GITLAB_ENABLED_DEFAULT@" "@OPENID_SETTINGS@" "@OPENID_ENABLED_DEFAULT@" "@OPENID_SECRET_FALLBACK@" ]
       [ (builtins.toJSON cfg.publicUrl)
         (builtins.toJSON brandHtmlValue)
-        gitlabSettingsJSON
+        (toPythonLiteral gitlabSettings)
         (builtins.toJSON cfg.gitlab.clientSecretFallback)
         (if cfg.gitlab.enable then "True" else "False")
-        openIdSettingsJSON
+        (toPythonLiteral openIdSettings)
         (if cfg.openid.enable then "True" else "False")
         (builtins.toJSON cfg.openid.clientSecretFallback)
       ]
@@ -26,7 +26,13 @@ except ImportError as exc:  # pragma: no cover - runtime guard
     )
     raise SystemExit(2) from exc
 
-AGE_KEY_RE = re.compile(r"^age1[0-9a-z]{8,}$")
+try:  # libyaml-backed loader when PyYAML was built with it.
+    from yaml import CSafeLoader as _SafeLoader  # type: ignore
+except ImportError:  # pragma: no cover - pure-Python PyYAML
+    from yaml import SafeLoader as _SafeLoader  # type: ignore
+
+# Use with fullmatch(): unlike "^...$" with match(), it rejects a trailing newline.
+AGE_KEY_RE = re.compile(r"age1[0-9a-z]{8,}")
 
 
 class LintResult:
@@ -51,8 +57,8 @@ class LintResult:
 def read_yaml(path: Path, description: str) -> dict:
     if not path.exists():
         raise FileNotFoundError(f"{description} not found at {path}")
-    with path.open("r", encoding="utf-8") as handle:
-        data = yaml.safe_load(handle)  # type: ignore[no-any-unimported]
+    # Hand libyaml raw bytes; it detects the encoding itself.
+    data = yaml.load(path.read_bytes(), Loader=_SafeLoader)  # type: ignore[no-any-unimported]
     return data or {}
 
 
@@ -69,7 +75,7 @@ def collect_age_keys(keys_node: Iterable) -> Tuple[List[str], List[str]]:
         if "example" in raw:
             errors.append(f"Placeholder key still present: {raw}")
             continue
-        if not AGE_KEY_RE.match(raw):
+        if not AGE_KEY_RE.fullmatch(raw):
             errors.append(f"Invalid age public key format: {raw}")
             continue
         valid.append(raw)
@@ -80,7 +86,7 @@ def collect_age_keys(keys_node: Iterable) -> Tuple[List[str], List[str]]:
 
 def validate_creation_rules(rules: Iterable, known_keys: Iterable[str]) -> List[str]:
     errors: List[str] = []
-    known = set(known_keys)
+    known = frozenset(known_keys)
     for idx, rule in enumerate(rules or [], start=1):
         if not isinstance(rule, dict):
             errors.append(f"creation_rules[{idx}] must be a mapping")
@@ -103,24 +109,28 @@ def validate_creation_rules(rules: Iterable, known_keys: Iterable[str]) -> List[
                     f"creation_rules[{idx}].key_groups[{group_idx}] missing age list"
                 )
                 continue
-            for key in age_keys:
-                if not isinstance(key, str):
-                    errors.append(
-                        f"creation_rules[{idx}].key_groups[{group_idx}] contains non-string key"
-                    )
-                    continue
-                if "example" in key:
-                    errors.append(
-                        f"creation_rules[{idx}] references placeholder key '{key}'"
-                    )
-                if not AGE_KEY_RE.match(key):
-                    errors.append(
-                        f"creation_rules[{idx}] references malformed key '{key}'"
-                    )
-                if known and key not in known:
-                    errors.append(
-                        f"creation_rules[{idx}] references key '{key}' not listed under top-level keys"
-                    )
+            key_list = [key for key in age_keys if isinstance(key, str)]
+            if len(key_list) != len(age_keys):
+                errors.append(
+                    f"creation_rules[{idx}].key_groups[{group_idx}] contains non-string key"
+                )
+            errors.extend(
+                f"creation_rules[{idx}] references placeholder key '{key}'"
+                for key in key_list
+                if "example" in key
+            )
+            errors.extend(
+                f"creation_rules[{idx}] references malformed key '{key}'"
+                for key in key_list
+                if not AGE_KEY_RE.fullmatch(key)
+            )
+            if known:
+                unknown = set(key_list).difference(known)
+                errors.extend(
+                    f"creation_rules[{idx}] references key '{key}' not listed under top-level keys"
+                    for key in key_list
+                    if key in unknown
+                )
     return errors
 
 
@@ -140,7 +150,8 @@ def validate_secrets_file(path: Path, known_keys: Iterable[str]) -> Tuple[List[s
             recipients.append(entry["recipient"])
     if not recipients:
         errors.append(f"{path}: sops.age recipients list is empty")
-    missing = [r for r in recipients if r not in set(known_keys)]
+    known = frozenset(known_keys)
+    missing = [r for r in recipients if r not in known]
     if missing:
         errors.append(
             f"{path}: recipients not present in .sops.yaml keys: {', '.join(missing)}"
@@ -3,10 +3,12 @@
 from __future__ import annotations
 
 import subprocess
+import sys
 import time
+from collections import deque
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional, Sequence, Union
+from typing import Deque, List, Optional, Sequence, Union
 
 
 @dataclass
@@ -70,3 +72,35 @@ def run_command(
         raise ProcessError(result)
 
     return result
+
+
+def run_streamed(
+    command: Sequence[str],
+    *,
+    cwd: Optional[Union[str, Path]] = None,
+    env: Optional[dict] = None,
+    tail_lines: int = 200,
+) -> ProcessResult:
+    """Run a long, chatty command with its output going to the terminal.
+
+    stdout is inherited; stderr is echoed line by line and only the last
+    ``tail_lines`` lines are kept for ``ProcessResult.stderr``, so memory stays
+    bounded however verbose the command is (e.g. ``nix build --show-trace``).
+    """
+    start = time.monotonic()
+    tail: Deque[str] = deque(maxlen=tail_lines)
+    with subprocess.Popen(
+        command,
+        cwd=str(cwd) if isinstance(cwd, Path) else cwd,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors="replace",
+        bufsize=1,
+    ) as proc:
+        for line in proc.stderr:
+            sys.stderr.write(line)
+            tail.append(line)
+        returncode = proc.wait()
+    return ProcessResult(list(command), returncode, "", "".join(tail), time.monotonic() - start)
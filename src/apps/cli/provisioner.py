@@ -2,13 +2,63 @@
 
 from __future__ import annotations
 
+import errno
+import inspect
 import os
 import shutil
+import struct
 import subprocess
+import sys
 import tempfile
 import time
+import uuid
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
+
+
+# Linux FICLONE ioctl: share extents with the source on btrfs/XFS instead of copying.
+_FICLONE = 0x40049409
+_CLONE_UNSUPPORTED = (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS)
+
+
+def clone_image(source: Path, target: Path) -> str:
+    """Copy a VM image, preferring a copy-on-write reflink where supported.
+
+    Falls back to copy_file_range, which keeps the data in the kernel (and
+    may still share extents on filesystems that support it), and finally to
+    a plain copy. Returns the method used ("reflink", "copy_file_range" or
+    "copy").
+    """
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover - non-POSIX hosts
+        fcntl = None
+
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                return "reflink"
+            except OSError as exc:
+                if exc.errno not in _CLONE_UNSUPPORTED:
+                    raise
+
+        if hasattr(os, "copy_file_range"):
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return "copy_file_range"
+            except OSError as exc:
+                if exc.errno not in _CLONE_UNSUPPORTED:
+                    raise
+
+    shutil.copyfile(source, target)
+    return "copy"
 
 
 def create_blank_disk(target: Path, size_gb: int = 20) -> Dict[str, Any]:
@@ -67,30 +117,68 @@ def create_blank_disk(target: Path, size_gb: int = 20) -> Dict[str, Any]:
                 pass
 
 
-def inject_ssh_key(image_path: str, ssh_public_key: str) -> Dict[str, Any]:
-    """Inject SSH public key into VM image using guestfish."""
-    try:
-        escaped_key = ssh_public_key.replace('"', '\\"')
-        guestfish_script = f'''launch
-list-filesystems
-mount /dev/sda1 /
-mkdir-p /root/.ssh
-write /root/.ssh/authorized_keys "{escaped_key}\\n"
-chmod 0700 /root/.ssh
-chmod 0600 /root/.ssh/authorized_keys
-chown 0 0 /root/.ssh
-chown 0 0 /root/.ssh/authorized_keys
-sync
-umount /
-exit
-'''
+def create_overlay_disk(base_image: Path, target: Path) -> Dict[str, Any]:
+    """Create a copy-on-write QCOW2 overlay of ``base_image`` at ``target``."""
 
-        result = subprocess.run(
-            ["guestfish", "--add", image_path, "--rw"],
-            input=guestfish_script,
-            text=True,
+    qemu_img = shutil.which("qemu-img")
+    if not qemu_img:
+        return {"success": False, "error": "Required tooling missing: qemu-img"}
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if target.exists():
+            target.unlink()
+        subprocess.run(
+            [
+                qemu_img,
+                "create",
+                "-f",
+                "qcow2",
+                "-F",
+                "qcow2",
+                "-b",
+                str(base_image.resolve()),
+                str(target),
+            ],
+            check=True,
             capture_output=True,
+            text=True,
         )
+        target.chmod(0o644)
+        return {"success": True}
+    except subprocess.CalledProcessError as exc:
+        return {
+            "success": False,
+            "error": exc.stderr.strip() if exc.stderr else str(exc),
+        }
+    except OSError as exc:
+        return {"success": False, "error": str(exc)}
+
+
+def inject_ssh_key(image_path: str, ssh_public_key: str) -> Dict[str, Any]:
+    """Inject SSH public key into VM image using guestfish."""
+    # Pass every command as argv tokens (":" separates commands) so the key
+    # reaches guestfish verbatim, with no script quoting to escape.
+    commands = [
+        ["launch"],
+        ["mount", "/dev/sda1", "/"],
+        ["mkdir-p", "/root/.ssh"],
+        ["write", "/root/.ssh/authorized_keys", ssh_public_key + "\n"],
+        ["chmod", "0700", "/root/.ssh"],
+        ["chmod", "0600", "/root/.ssh/authorized_keys"],
+        ["chown", "0", "0", "/root/.ssh"],
+        ["chown", "0", "0", "/root/.ssh/authorized_keys"],
+        ["sync"],
+        ["umount", "/"],
+    ]
+    argv = ["guestfish", "--rw", "--add", image_path, "--"]
+    for index, command in enumerate(commands):
+        if index:
+            argv.append(":")
+        argv.extend(command)
+
+    try:
+        result = subprocess.run(argv, text=True, capture_output=True)
 
         if result.returncode != 0:
             print(f"Guestfish failed: {result.stderr}")
@@ -177,8 +265,96 @@ exit
                 pass
 
 
+def _write_root_authorized_key(mount_point: str, ssh_public_key: str) -> None:
+    """Write /root/.ssh/authorized_keys inside a mounted image (caller must be root)."""
+    ssh_dir = os.path.join(mount_point, "root", ".ssh")
+    authorized_keys = os.path.join(ssh_dir, "authorized_keys")
+
+    os.makedirs(ssh_dir, mode=0o700, exist_ok=True)
+    fd = os.open(authorized_keys, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    try:
+        os.write(fd, ssh_public_key.encode() + b"\n")
+        os.fchmod(fd, 0o600)
+        os.fchown(fd, 0, 0)
+    finally:
+        os.close(fd)
+    os.chmod(ssh_dir, 0o700)
+    os.chown(ssh_dir, 0, 0)
+
+
+def _sudo_write_root_authorized_key(mount_point: str, ssh_public_key: str) -> None:
+    """Run _write_root_authorized_key under sudo in a single interpreter.
+
+    The key travels as an argv entry, so it never passes through a shell.
+    """
+    helper = (
+        "import os, sys\n"
+        + inspect.getsource(_write_root_authorized_key)
+        + "_write_root_authorized_key(sys.argv[1], sys.argv[2])\n"
+    )
+    subprocess.run(
+        ["sudo", sys.executable, "-c", helper, mount_point, ssh_public_key],
+        check=True,
+    )
+
+
+_SECTOR_SIZE = 512
+
+# GPT partition types that never hold a mountable root filesystem.
+_GPT_SKIP_TYPES = {
+    bytes(16),  # unused entry
+    uuid.UUID("C12A7328-F81F-11D2-BA4B-00A0C93EC93B").bytes_le,  # EFI system
+    uuid.UUID("21686148-6449-6E6F-744E-656564454649").bytes_le,  # BIOS boot
+    uuid.UUID("0657FD6D-A4AB-43C4-84E5-0933C84B4F4F").bytes_le,  # Linux swap
+}
+_MBR_LINUX_TYPE = 0x83
+_MBR_GPT_PROTECTIVE_TYPE = 0xEE
+
+
+def _data_partition_offsets(raw_image: str) -> List[int]:
+    """Return byte offsets of candidate filesystem partitions in a raw disk image.
+
+    Reads the GPT (or legacy MBR) partition table directly rather than
+    parsing ``parted -m`` output. Raises ValueError on a malformed table.
+    """
+    with open(raw_image, "rb") as handle:
+        mbr = handle.read(_SECTOR_SIZE)
+        if len(mbr) < _SECTOR_SIZE or mbr[510:512] != b"\x55\xaa":
+            return []
+
+        entries = [mbr[446 + 16 * i : 462 + 16 * i] for i in range(4)]
+        if not any(entry[4] == _MBR_GPT_PROTECTIVE_TYPE for entry in entries):
+            return [
+                struct.unpack_from("<I", entry, 8)[0] * _SECTOR_SIZE
+                for entry in entries
+                if entry[4] == _MBR_LINUX_TYPE
+            ]
+
+        header = handle.read(_SECTOR_SIZE)
+        if header[:8] != b"EFI PART":
+            raise ValueError("protective MBR present but GPT header is missing")
+        entries_lba, entry_count, entry_size = struct.unpack_from("<QII", header, 72)
+        if entry_size < 128:
+            raise ValueError(f"unexpected GPT entry size {entry_size}")
+
+        handle.seek(entries_lba * _SECTOR_SIZE)
+        table = handle.read(entry_count * entry_size)
+        if len(table) < entry_count * entry_size:
+            raise ValueError("GPT partition table is truncated")
+
+    offsets = []
+    for index in range(entry_count):
+        entry = table[index * entry_size : (index + 1) * entry_size]
+        if entry[:16] in _GPT_SKIP_TYPES:
+            continue
+        offsets.append(struct.unpack_from("<Q", entry, 32)[0] * _SECTOR_SIZE)
+    return offsets
+
+
 def inject_ssh_key_simple(image_path: str, ssh_public_key: str) -> Dict[str, Any]:
     """SSH key injection using loop mount approach."""
+    is_root = hasattr(os, "geteuid") and os.geteuid() == 0
+    sudo = [] if is_root else ["sudo"]
     try:
         with tempfile.TemporaryDirectory() as temp_dir:
             mount_point = os.path.join(temp_dir, "mnt")
@@ -198,51 +374,38 @@ def inject_ssh_key_simple(image_path: str, ssh_public_key: str) -> Dict[str, Any
                 text=True,
             )
 
-            result = subprocess.run(
-                ["parted", "-m", raw_image, "print"], capture_output=True, text=True
-            )
-
-            if result.returncode == 0:
-                lines = result.stdout.strip().split("\n")
-                for line in lines[2:]:
-                    parts = line.split(":")
-                    if len(parts) >= 5 and ("ext" in parts[4] or "linux" in parts[5].lower()):
-                        start_sector = parts[1].rstrip("s")
-                        try:
-                            start_bytes = int(start_sector) * 512
-
-                            mount_result = subprocess.run(
-                                ["sudo", "mount", "-o", f"loop,offset={start_bytes}", raw_image, mount_point],
-                                capture_output=True,
-                                text=True,
-                            )
-
-                            if mount_result.returncode == 0:
-                                ssh_dir = os.path.join(mount_point, "root", ".ssh")
-                                authorized_keys = os.path.join(ssh_dir, "authorized_keys")
-
-                                subprocess.run(["sudo", "mkdir", "-p", ssh_dir], check=True)
-                                subprocess.run(
-                                    ["sudo", "sh", "-c", f"echo '{ssh_public_key}' > {authorized_keys}"],
-                                    check=True,
-                                )
-                                subprocess.run(["sudo", "chmod", "700", ssh_dir], check=True)
-                                subprocess.run(["sudo", "chmod", "600", authorized_keys], check=True)
-                                subprocess.run(["sudo", "chown", "root:root", ssh_dir], check=True)
-                                subprocess.run(["sudo", "chown", "root:root", authorized_keys], check=True)
-
-                                subprocess.run(["sudo", "umount", mount_point], check=True)
-
-                                subprocess.run(
-                                    ["qemu-img", "convert", "-f", "raw", "-O", "qcow2", raw_image, image_path],
-                                    check=True,
-                                )
-
-                                return {"success": True, "method": "loop_mount"}
-
-                        except (ValueError, subprocess.CalledProcessError):
-                            subprocess.run(["sudo", "umount", mount_point], capture_output=True)
-                            continue
+            try:
+                offsets = _data_partition_offsets(raw_image)
+            except (ValueError, OSError) as exc:
+                print(f"⚠️  Could not read partition table: {exc}")
+                offsets = []
+
+            for start_bytes in offsets:
+                try:
+                    mount_result = subprocess.run(
+                        [*sudo, "mount", "-o", f"loop,offset={start_bytes}", raw_image, mount_point],
+                        capture_output=True,
+                        text=True,
+                    )
+
+                    if mount_result.returncode == 0:
+                        if is_root:
+                            _write_root_authorized_key(mount_point, ssh_public_key)
+                        else:
+                            _sudo_write_root_authorized_key(mount_point, ssh_public_key)
+
+                        subprocess.run([*sudo, "umount", mount_point], check=True)
+
+                        subprocess.run(
+                            ["qemu-img", "convert", "-f", "raw", "-O", "qcow2", raw_image, image_path],
+                            check=True,
+                        )
+
+                        return {"success": True, "method": "loop_mount"}
+
+                except (ValueError, OSError, subprocess.CalledProcessError):
+                    subprocess.run([*sudo, "umount", mount_point], capture_output=True)
+                    continue
 
             return inject_ssh_key_cloud_init(image_path, ssh_public_key)
 
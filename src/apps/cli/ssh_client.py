@@ -3,6 +3,7 @@
 from __future__ import annotations
 
 import shutil
+import socket
 import time
 from pathlib import Path
 from typing import Any, Dict, Optional
@@ -56,6 +57,25 @@ def build_ssh_command(
     return {"success": True, "command": command}
 
 
+def wait_for_ssh(port: int, *, timeout: float = 30.0, interval: float = 0.2) -> bool:
+    """Poll until sshd inside the VM sends its banner on the forwarded port.
+
+    QEMU's user-mode forwarder accepts TCP connections as soon as QEMU starts,
+    so a bare connect() says nothing about the guest; the "SSH-" banner does.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1.0) as sock:
+                if sock.recv(4) == b"SSH-":
+                    return True
+        except OSError:
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+
+
 def run_remote_script(
     config: Dict[str, Any],
     remote_script: str,
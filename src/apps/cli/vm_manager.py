@@ -3,32 +3,38 @@ VM Manager - Handles RAVE virtual machine lifecycle operations
 """
 
 import base64
+import functools
 import json
 import os
 import re
 import shlex
+import signal
 import socket
 import shutil
 import subprocess
 import textwrap
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from pydantic import ValidationError
 
 from models import VMConfigModel
-from process_utils import ProcessError, ProcessResult, run_command
+from process_utils import ProcessError, ProcessResult, run_command, run_streamed
 from platform_utils import PlatformManager
 from provisioner import (
+    clone_image,
     create_blank_disk,
+    create_overlay_disk,
     ensure_root_authorized_key,
     inject_ssh_key,
     inject_ssh_key_cloud_init,
     inject_ssh_key_simple,
     install_age_key_into_image,
 )
-from ssh_client import build_ssh_command, run_remote_script, run_remote_stream
+from ssh_client import build_ssh_command, run_remote_script, run_remote_stream, wait_for_ssh
 
 
 class VMManager:
@@ -58,6 +64,20 @@ class VMManager:
         self.vms_dir = vms_dir
         self.vms_dir.mkdir(parents=True, exist_ok=True)
         self.platform = PlatformManager()
+
+        # Parsed VM configs keyed by company name, tagged with the file (mtime, size)
+        # they were read at so repeat lookups only cost a stat().
+        self._config_cache: Dict[str, Tuple[Tuple[int, int], VMConfigModel]] = {}
+        # Host ports already assigned to existing VMs, built on first use from
+        # a single scan of the config directory and kept current on save.
+        self._assigned_ports: Optional[Set[int]] = None
+        # create_vms runs create_vm on several threads: port selection must be
+        # atomic with its reservation, and nix builds share one result link.
+        self._port_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._prerequisites: Optional[Dict[str, any]] = None
+        # Status checks resolve the same pidfiles repeatedly; build each once.
+        self._pidfiles: Dict[str, Path] = {}
         
         # Override default ports with any provided configuration
         self.port_config = self.DEFAULT_PORTS.copy()
@@ -66,27 +86,57 @@ class VMManager:
     
     def check_prerequisites(self) -> Dict[str, any]:
         """Check if all required tools are available for VM operations."""
-        return self.platform.check_prerequisites()
+        # The probe shells out to nix; host tooling does not change within
+        # one CLI invocation, so the first answer is reused.
+        if self._prerequisites is None:
+            self._prerequisites = self.platform.check_prerequisites()
+        return self._prerequisites
+
+    @functools.cached_property
+    def _nix_build_command(self) -> Tuple[str, ...]:
+        """Base nix build invocation; callers append their own arguments."""
+        return tuple(self.platform.get_nix_build_command())
         
     def _get_vm_config_path(self, company_name: str) -> Path:
         """Get path to VM configuration file."""
         return self.vms_dir / f"{company_name}.json"
     
+    def _list_vm_names(self) -> List[str]:
+        """List company names with a config file, in one directory read."""
+        # scandir yields names straight from getdents; unlike Path.glob it
+        # builds no Path objects and needs no per-entry stat for regular files.
+        with os.scandir(self.vms_dir) as entries:
+            return [
+                entry.name[: -len(".json")]
+                for entry in entries
+                if entry.name.endswith(".json") and entry.is_file()
+            ]
+
     def _load_vm_config(self, company_name: str) -> Optional[Dict]:
         """Load VM configuration and validate it with Pydantic."""
         config_path = self._get_vm_config_path(company_name)
-        if not config_path.exists():
-            return None
         try:
-            raw = json.loads(config_path.read_text())
-        except (json.JSONDecodeError, FileNotFoundError):
+            stat = config_path.stat()
+        except FileNotFoundError:
+            self._config_cache.pop(company_name, None)
             return None
 
+        cached = self._config_cache.get(company_name)
+        # Size catches rewrites that land within the filesystem's mtime
+        # granularity (e.g. two saves in the same jiffy on ext4).
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if cached and cached[0] == signature:
+            return cached[1].model_dump()
+
         try:
-            validated = VMConfigModel.model_validate(raw)
+            # Parse and validate in one pass with pydantic's native JSON parser.
+            validated = VMConfigModel.model_validate_json(config_path.read_bytes())
+        except FileNotFoundError:
+            return None
         except ValidationError as exc:
             print(f"⚠️  VM config for '{company_name}' is invalid: {exc}")
             return None
+        self._config_cache[company_name] = (signature, validated)
         return validated.model_dump()
     
     def _save_vm_config(self, company_name: str, config: Dict):
@@ -96,8 +146,26 @@ class VMManager:
         except ValidationError as exc:
             raise ValueError(f"Unable to save VM config for {company_name}: {exc}") from exc
 
+        # Write to a sibling temp file and rename over the original so readers
+        # never observe a truncated config, even if we crash mid-write.
         config_path = self._get_vm_config_path(company_name)
-        config_path.write_text(json.dumps(validated.model_dump(), indent=2))
+        tmp_path = config_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            handle.write(validated.model_dump_json(indent=2))
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, config_path)
+        stat = config_path.stat()
+        previous = self._config_cache.get(company_name)
+        self._config_cache[company_name] = ((stat.st_mtime_ns, stat.st_size), validated)
+        if self._assigned_ports is not None:
+            ports = set(validated.ports.model_dump().values())
+            if previous:
+                # Ports this VM no longer uses are free for other tenants.
+                self._assigned_ports.difference_update(
+                    set(previous[1].ports.model_dump().values()) - ports
+                )
+            self._assigned_ports.update(ports)
 
     def _build_ssh_command(
         self,
@@ -162,16 +230,18 @@ class VMManager:
         # Check availability and find alternatives if needed
         final_ports = {}
         
-        for port_type in ["http", "https", "ssh", "test"]:
-            preferred_port = ports[port_type]
-            
-            if self._host_port_available(preferred_port):
-                final_ports[port_type] = preferred_port
-            else:
-                # Find next available port starting from preferred + 1
-                alternative_port = self._find_next_available_port(preferred_port + 1)
-                final_ports[port_type] = alternative_port
-                print(f"⚠️  Port {preferred_port} ({port_type}) unavailable, using {alternative_port}")
+        with self._port_lock:
+            for port_type in ["http", "https", "ssh", "test"]:
+                preferred_port = ports[port_type]
+                
+                if self._port_available(preferred_port):
+                    final_ports[port_type] = preferred_port
+                else:
+                    # Find next available port starting from preferred + 1
+                    alternative_port = self._find_next_available_port(preferred_port + 1)
+                    final_ports[port_type] = alternative_port
+                    print(f"⚠️  Port {preferred_port} ({port_type}) unavailable, using {alternative_port}")
+                self._get_assigned_ports().add(final_ports[port_type])
         
         return (
             final_ports["http"],
@@ -185,16 +255,18 @@ class VMManager:
         assignments: Dict[str, int] = {}
         requested = requested_ports or {}
 
-        for service, default_port in self.DATA_PLANE_PORT_DEFAULTS.items():
-            preferred = requested.get(service, default_port)
-            if self._host_port_available(preferred):
-                assignments[service] = preferred
-            else:
-                alternative = self._find_next_available_port(preferred + 1)
-                assignments[service] = alternative
-                print(
-                    f"⚠️  Port {preferred} ({service}) unavailable, using {alternative} instead"
-                )
+        with self._port_lock:
+            for service, default_port in self.DATA_PLANE_PORT_DEFAULTS.items():
+                preferred = requested.get(service, default_port)
+                if self._port_available(preferred):
+                    assignments[service] = preferred
+                else:
+                    alternative = self._find_next_available_port(preferred + 1)
+                    assignments[service] = alternative
+                    print(
+                        f"⚠️  Port {preferred} ({service}) unavailable, using {alternative} instead"
+                    )
+                self._get_assigned_ports().add(assignments[service])
 
         return assignments
 
@@ -207,11 +279,34 @@ class VMManager:
             except OSError:
                 return False
         return True
+
+    def _get_assigned_ports(self) -> Set[int]:
+        """Return host ports claimed by existing VM configs, scanning once."""
+        if self._assigned_ports is None:
+            assigned: Set[int] = set()
+            for company_name in self._list_vm_names():
+                config = self._load_vm_config(company_name)
+                if config:
+                    assigned.update(config["ports"].values())
+            self._assigned_ports = assigned
+        return self._assigned_ports
+
+    def _release_ports(self, ports: Iterable[int]) -> None:
+        """Return ports reserved for a VM that was never saved."""
+        with self._port_lock:
+            if self._assigned_ports is not None:
+                self._assigned_ports.difference_update(ports)
+
+    def _port_available(self, port: int) -> bool:
+        """Check a port is neither assigned to another VM nor bound on the host."""
+        # Stopped VMs leave their ports unbound, so the host probe alone would
+        # hand the same ports to a second tenant.
+        return port not in self._get_assigned_ports() and self._host_port_available(port)
     
     def _find_next_available_port(self, start_port: int, max_attempts: int = 100) -> int:
         """Find the next available port starting from start_port."""
         for port in range(start_port, start_port + max_attempts):
-            if self._host_port_available(port):
+            if self._port_available(port):
                 return port
         raise RuntimeError(f"Could not find available port in range {start_port}-{start_port + max_attempts}")
     
@@ -219,20 +314,13 @@ class VMManager:
         """Build VM image using Nix for the requested profile."""
         try:
             # For now, custom company builds reuse the shared qcow2 artifact.
-            nix_cmd = self.platform.get_nix_build_command()
-            nix_cmd.extend(["--show-trace", f".#{profile_attr}"])
+            nix_cmd = [*self._nix_build_command, "--show-trace", f".#{profile_attr}"]
 
             env = os.environ.copy()
             if pomerium_config:
                 env["RAVE_POMERIUM_CONFIG_JSON"] = json.dumps(pomerium_config)
 
-            result = subprocess.run(
-                nix_cmd,
-                cwd=Path.cwd(),
-                capture_output=True,
-                text=True,
-                env=env,
-            )
+            result = run_streamed(nix_cmd, cwd=Path.cwd(), env=env)
 
             warning: Optional[str] = None
 
@@ -240,15 +328,8 @@ class VMManager:
                 warning = (
                     f"nix build .#{profile_attr} failed; falling back to default build"
                 )
-                fallback_cmd = self.platform.get_nix_build_command()
-                fallback_cmd.extend(["--show-trace"])
-                result = subprocess.run(
-                    fallback_cmd,
-                    cwd=Path.cwd(),
-                    capture_output=True,
-                    text=True,
-                    env=env,
-                )
+                fallback_cmd = [*self._nix_build_command, "--show-trace"]
+                result = run_streamed(fallback_cmd, cwd=Path.cwd(), env=env)
                 if result.returncode != 0:
                     return {
                         "success": False,
@@ -292,14 +373,21 @@ class VMManager:
         """Build a custom VM for a specific company with SSH key injection."""
         # For now, let's use the standard development build and inject keys at runtime
         # This is simpler and more reliable than custom builds per company
-        return subprocess.run([
-            "nix", "build", "--show-trace"
-        ], cwd="/home/nathan/Projects/rave", capture_output=True, text=True)
+        result = run_streamed([*self._nix_build_command, "--show-trace"], cwd="/home/nathan/Projects/rave")
+        return subprocess.CompletedProcess(result.command, result.returncode, "", result.stderr)
+
+    def _clone_image(self, source: Path, target: Path) -> str:
+        """Clone a base image for a VM using shared helper."""
+        return clone_image(source, target)
 
     def _create_blank_disk(self, target: Path, size_gb: int = 20) -> Dict[str, any]:
         """Create a fresh QCOW2 disk image using shared helper."""
         return create_blank_disk(target, size_gb)
     
+    def _create_overlay_disk(self, base_image: Path, target: Path) -> Dict[str, any]:
+        """Create a QCOW2 overlay backed by the profile base image using shared helper."""
+        return create_overlay_disk(base_image, target)
+    
     def _inject_ssh_key(self, image_path: str, ssh_public_key: str) -> Dict[str, any]:
         """Inject SSH public key into VM image using shared helper."""
         return inject_ssh_key(image_path, ssh_public_key)
@@ -314,6 +402,9 @@ class VMManager:
     def _inject_ssh_key_cloud_init(self, image_path: str, ssh_public_key: str) -> Dict[str, any]:
         return inject_ssh_key_cloud_init(image_path, ssh_public_key)
 
+    def _wait_for_ssh(self, port: int, timeout: float = 30.0) -> bool:
+        return wait_for_ssh(port, timeout=timeout)
+
     def _ensure_root_authorized_key(self, config: Dict[str, any]) -> bool:
         return ensure_root_authorized_key(config)
 
@@ -330,8 +421,14 @@ class VMManager:
         pomerium_metadata: Optional[Dict[str, any]] = None,
         *,
         skip_build: bool = False,
+        inject_at_build: bool = False,
     ) -> Dict[str, any]:
-        """Create a new company VM for the requested profile."""
+        """Create a new company VM for the requested profile.
+
+        The root SSH key is provisioned over SSH on first start. Pass
+        ``inject_at_build=True`` to write it into the image up front instead,
+        for hosts where the VM cannot be reached with the agent password.
+        """
         if self._load_vm_config(company_name):
             return {"success": False, "error": f"VM '{company_name}' already exists"}
 
@@ -357,7 +454,12 @@ class VMManager:
         if skip_build:
             build_result = {"success": False, "error": "build skipped"}
         else:
-            build_result = self._build_vm_image(profile_attr, pomerium_config)
+            with self._build_lock:
+                build_result = self._build_vm_image(profile_attr, pomerium_config)
+                # The image sits behind the shared ./result link, which the
+                # next build repoints; pin its store path before releasing.
+                if build_result.get("success") and build_result.get("image"):
+                    build_result["image"] = Path(build_result["image"]).resolve()
 
         if build_result.get("success"):
             built_image = build_result.get("image")
@@ -371,116 +473,156 @@ class VMManager:
                 print("🔄 Will attempt to use existing working image...")
 
         http_port, https_port, ssh_port, test_port = self._get_port_range(custom_ports)
-
-        repo_root = default_image_path.parent if default_image_path else Path.cwd()
-        repo_root.mkdir(parents=True, exist_ok=True)
-        image_filename = f"{company_name}-{profile}.qcow2"
-        target_image_path = repo_root / image_filename
-
-        config: Dict[str, any] = {
-            "name": company_name,
-            "keypair": str(keypair_path),
-            "profile": profile,
-            "profile_attr": profile_attr,
-            "ssh_public_key": ssh_public_key,
-            "ports": {
-                "http": http_port,
-                "https": https_port,
-                "ssh": ssh_port,
-                "test": test_port,
-            },
-            "status": "stopped",
-            "created_at": time.time(),
-            "image_path": str(target_image_path),
-        }
-        if pomerium_metadata:
-            config["idp"] = pomerium_metadata
-
-        profile_is_dataplane = profile_attr.lower() == "dataplane" or profile.lower() == "dataplane"
-        if profile_is_dataplane:
-            service_ports = self._assign_data_plane_ports(custom_ports)
-            if service_ports:
-                config["ports"].update(service_ports)
-                summary = ", ".join(f"{name}:{port}" for name, port in service_ports.items())
-                print(f"🗄️  Forwarding data-plane services -> host {summary}")
-
+        # The ports are reserved as soon as they are chosen so concurrent
+        # create_vm calls cannot pick them too; hand them back on failure.
+        reserved_ports: List[int] = [http_port, https_port, ssh_port, test_port]
+        saved = False
         try:
-            if image_source and image_source.exists():
-                shutil.copy2(image_source, target_image_path)
-            elif default_image_path and default_image_path.exists():
-                print(f"Using existing {profile} profile image at {default_image_path}")
-                shutil.copy2(default_image_path, target_image_path)
-            else:
-                legacy_candidates = [
-                    repo_root / "rave-complete-localhost.qcow2",
-                    repo_root / "artifacts" / "legacy-qcow" / "rave-complete-localhost.qcow2",
-                ]
-                legacy_image = next((path for path in legacy_candidates if path.exists()), None)
-                if legacy_image:
-                    warning = (
-                        "Legacy rave-complete-localhost.qcow2 image reused; "
-                        f"build the '{profile}' profile with 'rave vm build-image --profile {profile}' for deterministic results."
-                    )
-                    print(warning)
-                    warnings.append(warning)
-                    shutil.copy2(legacy_image, target_image_path)
-                else:
-                    return {
-                        "success": False,
-                        "error": (
-                            f"No VM image available for profile '{profile}'. "
-                            f"Run 'rave vm build-image --profile {profile}' before creating tenants."
-                        ),
-                    }
-
-            target_image_path.chmod(0o644)
-
-            injection_result = self._inject_ssh_key(
-                str(target_image_path), ssh_public_key
-            )
-            if not injection_result["success"]:
-                print(
-                    f"⚠️  SSH key injection failed: {injection_result.get('error', 'Unknown error')}"
-                )
-                print("🔄 VM will be created but may require password authentication")
-
-            if age_key_path:
-                age_result = self._install_age_key_into_image(
-                    config["image_path"],
-                    age_key_path,
-                )
-
-                secrets_meta: Dict[str, any] = {
-                    "age_key_path": str(age_key_path),
-                    "age_key_installed": age_result.get("success", False),
-                }
+            repo_root = default_image_path.parent if default_image_path else Path.cwd()
+            repo_root.mkdir(parents=True, exist_ok=True)
+            image_filename = f"{company_name}-{profile}.qcow2"
+            target_image_path = repo_root / image_filename
+
+            config: Dict[str, any] = {
+                "name": company_name,
+                "keypair": str(keypair_path),
+                "profile": profile,
+                "profile_attr": profile_attr,
+                "ssh_public_key": ssh_public_key,
+                "ports": {
+                    "http": http_port,
+                    "https": https_port,
+                    "ssh": ssh_port,
+                    "test": test_port,
+                },
+                "status": "stopped",
+                "created_at": time.time(),
+                "image_path": str(target_image_path),
+            }
+            if pomerium_metadata:
+                config["idp"] = pomerium_metadata
+
+            profile_is_dataplane = profile_attr.lower() == "dataplane" or profile.lower() == "dataplane"
+            if profile_is_dataplane:
+                service_ports = self._assign_data_plane_ports(custom_ports)
+                reserved_ports.extend(service_ports.values())
+                if service_ports:
+                    config["ports"].update(service_ports)
+                    summary = ", ".join(f"{name}:{port}" for name, port in service_ports.items())
+                    print(f"🗄️  Forwarding data-plane services -> host {summary}")
 
-                if age_result.get("success"):
-                    config["secrets"] = secrets_meta
+            try:
+                if image_source and image_source.exists():
+                    self._clone_image(image_source, target_image_path)
+                    config["base_image"] = str(image_source.resolve())
+                elif default_image_path and default_image_path.exists():
+                    print(f"Using existing {profile} profile image at {default_image_path}")
+                    self._clone_image(default_image_path, target_image_path)
+                    config["base_image"] = str(default_image_path.resolve())
                 else:
-                    error_msg = age_result.get(
-                        "error", "Failed to embed Age key into VM image"
+                    legacy_candidates = [
+                        repo_root / "rave-complete-localhost.qcow2",
+                        repo_root / "artifacts" / "legacy-qcow" / "rave-complete-localhost.qcow2",
+                    ]
+                    legacy_image = next((path for path in legacy_candidates if path.exists()), None)
+                    if legacy_image:
+                        warning = (
+                            "Legacy rave-complete-localhost.qcow2 image reused; "
+                            f"build the '{profile}' profile with 'rave vm build-image --profile {profile}' for deterministic results."
+                        )
+                        print(warning)
+                        warnings.append(warning)
+                        self._clone_image(legacy_image, target_image_path)
+                        config["base_image"] = str(legacy_image.resolve())
+                    else:
+                        return {
+                            "success": False,
+                            "error": (
+                                f"No VM image available for profile '{profile}'. "
+                                f"Run 'rave vm build-image --profile {profile}' before creating tenants."
+                            ),
+                        }
+
+                target_image_path.chmod(0o644)
+
+                config["inject_at_build"] = inject_at_build
+                config["ssh_key_configured"] = False
+                if inject_at_build:
+                    injection_result = self._inject_ssh_key(
+                        str(target_image_path), ssh_public_key
                     )
-                    warning = (
-                        "Age key could not be embedded via guestfish; secrets will "
-                        "be installed during the first boot. "
-                        f"Details: {error_msg}"
+                    if injection_result["success"]:
+                        config["ssh_key_configured"] = True
+                    else:
+                        print(
+                            f"⚠️  SSH key injection failed: {injection_result.get('error', 'Unknown error')}"
+                        )
+                        print("🔄 VM will be created but may require password authentication")
+
+                if age_key_path:
+                    age_result = self._install_age_key_into_image(
+                        config["image_path"],
+                        age_key_path,
                     )
-                    warnings.append(warning)
-                    secrets_meta["age_key_installed"] = False
-                    secrets_meta["age_key_embed_error"] = error_msg
-                    config["secrets"] = secrets_meta
 
-        except subprocess.CalledProcessError as exc:
-            return {"success": False, "error": f"Failed to copy VM image: {exc}"}
+                    secrets_meta: Dict[str, any] = {
+                        "age_key_path": str(age_key_path),
+                        "age_key_installed": age_result.get("success", False),
+                    }
 
-        self._save_vm_config(company_name, config)
+                    if age_result.get("success"):
+                        config["secrets"] = secrets_meta
+                    else:
+                        error_msg = age_result.get(
+                            "error", "Failed to embed Age key into VM image"
+                        )
+                        warning = (
+                            "Age key could not be embedded via guestfish; secrets will "
+                            "be installed during the first boot. "
+                            f"Details: {error_msg}"
+                        )
+                        warnings.append(warning)
+                        secrets_meta["age_key_installed"] = False
+                        secrets_meta["age_key_embed_error"] = error_msg
+                        config["secrets"] = secrets_meta
+
+            except (subprocess.CalledProcessError, OSError) as exc:
+                return {"success": False, "error": f"Failed to copy VM image: {exc}"}
+
+            self._save_vm_config(company_name, config)
+            saved = True
+        finally:
+            if not saved:
+                self._release_ports(reserved_ports)
 
         response: Dict[str, any] = {"success": True, "config": config}
         if warnings:
             response["warnings"] = warnings
         return response
     
+    def create_vms(
+        self, specs: List[Dict[str, any]], max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, any]]:
+        """Create several VMs concurrently; each spec holds create_vm kwargs.
+
+        Nix builds still run one at a time, but image clones, key and Age
+        injection for the different VMs overlap.
+        """
+        if not specs:
+            return {}
+
+        workers = max_workers or min(len(specs), os.cpu_count() or 1)
+        results: Dict[str, Dict[str, any]] = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.create_vm, **spec): spec["company_name"] for spec in specs}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    results[name] = {"success": False, "error": str(exc)}
+        return results
+
     def start_vm(self, company_name: str) -> Dict[str, any]:
         """Start a company VM."""
         config = self._load_vm_config(company_name)
@@ -555,7 +697,7 @@ class VMManager:
             age_key_dir=age_key_dir_str
         )
 
-        pidfile = self.platform.get_temp_dir() / f"rave-{company_name}.pid"
+        pidfile = self._get_pidfile_path(company_name)
         cmd.extend([
             "-daemonize",
             "-pidfile", str(pidfile)
@@ -580,14 +722,28 @@ class VMManager:
         ])
         
         try:
-            subprocess.run(cmd, check=True, env=env)
+            # close_fds=False with no preexec_fn/new session lets subprocess
+            # launch via posix_spawn instead of forking the whole interpreter.
+            # QEMU reattaches its stdio to /dev/null once it daemonizes, so
+            # capturing stderr does not block on the running VM.
+            subprocess.run(
+                cmd,
+                check=True,
+                env=env,
+                close_fds=False,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+            )
             
             # Update status
             config["status"] = "running"
             config["started_at"] = time.time()
             
-            # Wait a moment for VM to initialize
-            time.sleep(5)
+            # Wait for sshd rather than a fixed delay; key provisioning below
+            # keeps retrying if the guest is slower than this.
+            self._wait_for_ssh(ports["ssh"])
             if self._ensure_root_authorized_key(config):
                 config["ssh_key_configured"] = True
             
@@ -595,25 +751,61 @@ class VMManager:
             
             return {"success": True}
         except subprocess.CalledProcessError as e:
-            return {"success": False, "error": f"Failed to start VM: {e}"}
+            detail = (e.stderr or "").strip()
+            error = f"Failed to start VM: {e}"
+            if detail:
+                error = f"{error}\n{detail}"
+            return {"success": False, "error": error}
     
+    def start_many(
+        self, company_names: List[str], max_workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, any]]:
+        """Start several VMs concurrently and return each start_vm result.
+
+        Boot waits and SSH key provisioning dominate start_vm and are spent
+        blocked on child processes, so overlapping them in threads brings N
+        starts down to roughly the time of the slowest one.
+        """
+        if not company_names:
+            return {}
+
+        results: Dict[str, Dict[str, any]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers or len(company_names)) as pool:
+            futures = {pool.submit(self.start_vm, name): name for name in company_names}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                except Exception as exc:  # pylint: disable=broad-except
+                    results[name] = {"success": False, "error": str(exc)}
+        return results
+
     def stop_vm(self, company_name: str) -> Dict[str, any]:
         """Stop a company VM."""
         config = self._load_vm_config(company_name)
         if not config:
             return {"success": False, "error": f"VM '{company_name}' not found"}
         
-        # Kill VM process
-        pidfile = f"/tmp/rave-{company_name}.pid"
-        try:
-            if Path(pidfile).exists():
-                with open(pidfile, 'r') as f:
-                    pid = f.read().strip()
-                subprocess.run(["kill", pid], check=True)
-                Path(pidfile).unlink()
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            # Try alternative method
-            subprocess.run(["pkill", "-f", f"rave-{company_name}"], check=False)
+        # Kill VM process: SIGTERM, give QEMU a moment to exit, then SIGKILL.
+        # Without a usable pidfile, find QEMU by its -pidfile argument instead.
+        pid = self._read_pid(company_name)
+        pids = [pid] if pid is not None else self._find_vm_pids(company_name)
+        for target in pids:
+            try:
+                os.kill(target, signal.SIGTERM)
+                deadline = time.monotonic() + 2.0
+                while self._pid_alive(target) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                if self._pid_alive(target):
+                    os.kill(target, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                return {
+                    "success": False,
+                    "error": f"Permission denied stopping VM '{company_name}' (pid {target})",
+                }
+        self._get_pidfile_path(company_name).unlink(missing_ok=True)
         
         # Update status
         config["status"] = "stopped"
@@ -622,19 +814,58 @@ class VMManager:
         self._save_vm_config(company_name, config)
         
         return {"success": True}
-    
-    def _is_vm_running(self, company_name: str) -> bool:
-        """Check if VM is running (based on pidfile)."""
-        pidfile = Path(f"/tmp/rave-{company_name}.pid")
-        if not pidfile.exists():
-            return False
 
+    def _get_pidfile_path(self, company_name: str) -> Path:
+        """Get path to the QEMU pidfile written by start_vm."""
+        pidfile = self._pidfiles.get(company_name)
+        if pidfile is None:
+            pidfile = self.platform.get_temp_dir() / f"rave-{company_name}.pid"
+            self._pidfiles[company_name] = pidfile
+        return pidfile
+
+    def _read_pid(self, company_name: str) -> Optional[int]:
+        """Read the VM's QEMU pid, or None when there is no usable pidfile."""
         try:
-            pid = pidfile.read_text().strip()
-            subprocess.run(["kill", "-0", pid], check=True, capture_output=True)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError, OSError):
+            return int(self._get_pidfile_path(company_name).read_text().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _find_vm_pids(self, company_name: str) -> List[int]:
+        """Scan /proc for QEMU processes launched with this VM's pidfile."""
+        marker = str(self._get_pidfile_path(company_name)).encode()
+        pids: List[int] = []
+        try:
+            entries = os.scandir("/proc")
+        except OSError:
+            return pids
+        with entries:
+            for entry in entries:
+                if not entry.name.isdigit():
+                    continue
+                try:
+                    with open(f"/proc/{entry.name}/cmdline", "rb") as handle:
+                        argv = handle.read().split(b"\0")
+                except OSError:
+                    continue
+                if marker in argv:
+                    pids.append(int(entry.name))
+        return pids
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
             return False
+        except PermissionError:
+            # Exists but owned by another user.
+            return True
+        return True
+    
+    def _is_vm_running(self, company_name: str) -> bool:
+        """Check if VM is running (based on pidfile)."""
+        pid = self._read_pid(company_name)
+        return pid is not None and self._pid_alive(pid)
     
     def status_vm(self, company_name: str) -> Dict[str, any]:
         """Get VM status."""
@@ -652,17 +883,34 @@ class VMManager:
             "config": config
         }
     
+    def _collect_running_pids(self) -> Dict[str, int]:
+        """Map company name to QEMU pid for every VM whose process is alive."""
+        running: Dict[str, int] = {}
+        for pidfile in self.platform.get_temp_dir().glob("rave-*.pid"):
+            company_name = pidfile.name[len("rave-"):-len(".pid")]
+            pid = self._read_pid(company_name)
+            if pid is not None and self._pid_alive(pid):
+                running[company_name] = pid
+        return running
+
     def status_all_vms(self) -> Dict[str, Dict]:
         """Get status of all VMs."""
+        running = self._collect_running_pids()
+        names = self._list_vm_names()
+        # Config reads are I/O-bound; on a cold page cache overlapping them
+        # matters more than the thread start-up cost.
+        workers = min(32, (os.cpu_count() or 1) * 4, max(len(names), 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            configs = pool.map(self._load_vm_config, names)
         results = {}
-        for config_file in self.vms_dir.glob("*.json"):
-            company_name = config_file.stem
-            status_result = self.status_vm(company_name)
-            if status_result["success"]:
-                results[company_name] = {
-                    "running": status_result["running"],
-                    "status": status_result["status"]
-                }
+        for company_name, config in zip(names, configs):
+            if not config:
+                continue
+            is_running = company_name in running
+            results[company_name] = {
+                "running": is_running,
+                "status": "running" if is_running else "stopped"
+            }
         return results
     
     def reset_vm(self, company_name: str) -> Dict[str, any]:
@@ -677,28 +925,41 @@ class VMManager:
             if not stop_result["success"]:
                 return stop_result
         
-        # Rebuild and copy fresh VM image
-        build_result = self._build_vm_image()
-        if not build_result["success"]:
-            return build_result
+        # Prefer a copy-on-write overlay of the image the VM was created from;
+        # only rebuild when that base image is gone.
+        base_image = config.get("base_image")
+        if base_image and Path(base_image).exists():
+            create_result = self._create_overlay_disk(
+                Path(base_image), Path(config["image_path"])
+            )
+        else:
+            build_result = self._build_vm_image(config.get("profile_attr") or "development")
+            if not build_result["success"]:
+                return build_result
 
-        create_result = self._create_blank_disk(Path(config["image_path"]))
+            create_result = self._create_blank_disk(Path(config["image_path"]))
         if not create_result.get("success"):
             return create_result
 
+        # The fresh disk has no root key; unless the VM opted into pre-boot
+        # injection, the next start provisions it as after create_vm.
+        config["ssh_key_configured"] = False
         ssh_public_key = config.get("ssh_public_key")
-        if ssh_public_key:
+        if ssh_public_key and config.get("inject_at_build"):
             injection_result = self._inject_ssh_key(
                 config["image_path"], ssh_public_key
             )
             if not injection_result.get("success"):
+                self._save_vm_config(company_name, config)
                 return {
                     "success": True,
                     "warning": injection_result.get(
                         "error", "Unable to reinject SSH key"
                     ),
                 }
+            config["ssh_key_configured"] = True
 
+        self._save_vm_config(company_name, config)
         return {"success": True}
     
     def ssh_vm(self, company_name: str) -> Dict[str, any]:
@@ -712,7 +973,9 @@ class VMManager:
 
         # SSH with keypair (if available) or password fallback
         ports = config["ports"]
+        ssh_port = str(ports["ssh"])
         keypair_path = config.get("keypair")
+        has_keypair = bool(keypair_path) and Path(keypair_path).is_file()
         
         # Try SSH with multiple authentication methods
         known_host_flags = [
@@ -727,18 +990,29 @@ class VMManager:
             "-o",
             "ConnectTimeout=10",
         ]
+        # The connection test below opens a master connection that the
+        # interactive session then reuses, so we only pay one handshake.
+        control_flags = [
+            "-o",
+            "ControlMaster=auto",
+            "-o",
+            f"ControlPath={self.platform.get_temp_dir() / 'rave-ssh-%r@%h:%p'}",
+            "-o",
+            "ControlPersist=60",
+        ]
 
-        if keypair_path and Path(keypair_path).exists():
+        if has_keypair:
             # First try key-based authentication
             ssh_cmd = [
                 "ssh",
                 "-i",
                 keypair_path,
                 *known_host_flags,
+                *control_flags,
                 "-o",
                 "PasswordAuthentication=no",
                 "-p",
-                str(ports["ssh"]),
+                ssh_port,
                 "root@localhost",
             ]
             
@@ -749,7 +1023,6 @@ class VMManager:
             if test_result.returncode == 0:
                 print("🔑 SSH key authentication successful!")
                 # Use key-based auth
-                import os
                 os.execvp("ssh", ssh_cmd)
             else:
                 print("🔑 SSH key failed, trying password authentication...")
@@ -761,10 +1034,11 @@ class VMManager:
             "debug123",
             "ssh",
             *known_host_flags,
+            *control_flags,
             "-o",
             "PreferredAuthentications=password",
             "-p",
-            str(ports["ssh"]),
+            ssh_port,
             "root@localhost",
         ]
         
@@ -775,15 +1049,27 @@ class VMManager:
         if test_result.returncode == 0:
             print("🔐 SSH password authentication successful!")
             # Use password auth
-            import os
             os.execvp("sshpass", ssh_cmd)
         else:
             return {"success": False, "error": f"SSH connection failed with both key and password: {test_result.stderr}"}
     
     def get_logs(self, company_name: str, service: Optional[str] = None, 
                  follow: bool = False, tail: int = 50, since: Optional[str] = None,
-                 all_services: bool = False) -> Dict[str, any]:
-        """Get VM service logs."""
+                 all_services: bool = False, json_output: bool = False,
+                 log_format: str = "default") -> Dict[str, any]:
+        """Get VM service logs.
+
+        With ``json_output`` the entries are fetched as journal JSON and returned
+        under ``entries`` instead of being streamed to the terminal; it cannot
+        be combined with ``follow``.
+        ``log_format="message"`` prints bare messages (``--output=cat``), also when
+        following, which keeps the journal formatter and SSH traffic minimal.
+        """
+        if log_format not in ("default", "message"):
+            return {"success": False, "error": f"Unknown log format '{log_format}'"}
+        if json_output and follow:
+            return {"success": False, "error": "JSON log output cannot be combined with follow"}
+
         config = self._load_vm_config(company_name)
         if not config:
             return {"success": False, "error": f"VM '{company_name}' not found"}
@@ -793,7 +1079,9 @@ class VMManager:
         
         # Build SSH command for journalctl
         ports = config["ports"]
+        ssh_port = str(ports["ssh"])
         keypair_path = config.get("keypair")
+        has_keypair = bool(keypair_path) and Path(keypair_path).is_file()
         
         known_host_flags = [
             "-o",
@@ -806,14 +1094,14 @@ class VMManager:
             "ConnectTimeout=10",
         ]
 
-        if keypair_path and Path(keypair_path).exists():
+        if has_keypair:
             ssh_base = [
                 "ssh",
                 "-i",
                 keypair_path,
                 *known_host_flags,
                 "-p",
-                str(ports["ssh"]),
+                ssh_port,
                 "root@localhost",
             ]
             program = "ssh"
@@ -825,7 +1113,7 @@ class VMManager:
                 "ssh",
                 *known_host_flags,
                 "-p",
-                str(ports["ssh"]),
+                ssh_port,
                 "root@localhost",
             ]
             program = "sshpass"
@@ -834,17 +1122,23 @@ class VMManager:
         journalctl_cmd = ["journalctl"]
         
         if service and not all_services:
-            journalctl_cmd.extend(["-u", f"{service}.service"])
+            journalctl_cmd.append(f"--unit={service}.service")
         elif all_services:
             # Show logs from all main services
             services = ["traefik", "postgresql", "nats", "redis-default", "redis-gitlab"]
-            for svc in services:
-                journalctl_cmd.extend(["-u", f"{svc}.service"])
+            journalctl_cmd.extend(f"--unit={svc}.service" for svc in services)
         
         if follow:
-            journalctl_cmd.append("-f")
+            journalctl_cmd.append("--follow")
         else:
-            journalctl_cmd.extend(["-n", str(tail)])
+            journalctl_cmd.append(f"--lines={int(tail)}")
+
+        if json_output:
+            journalctl_cmd.append("--output=json")
+        elif log_format == "message":
+            journalctl_cmd.append("--output=cat")
+        elif not follow:
+            journalctl_cmd.append("--output=short-iso")
         
         if since:
             journalctl_cmd.extend(["--since", since])
@@ -852,6 +1146,26 @@ class VMManager:
         journalctl_cmd.append("--no-pager")
         
         full_cmd = ssh_base + journalctl_cmd
+
+        if json_output:
+            try:
+                result = run_command(full_cmd, timeout=60)
+            except ProcessError as exc:
+                return {"success": False, "error": f"Failed to get logs: {exc}"}
+            if result.returncode != 0:
+                return {
+                    "success": False,
+                    "error": f"Failed to get logs: {result.stderr.strip() or result.returncode}",
+                }
+            entries = []
+            for line in result.stdout.splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+            return {"success": True, "entries": entries}
         
         try:
             # Execute and stream output
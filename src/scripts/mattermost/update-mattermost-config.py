@@ -1,16 +1,19 @@
 #!/usr/bin/env python3
+import hashlib
 import json
 import os
 from pathlib import Path
 
 CONFIG_PATH = Path("/var/lib/mattermost/config/config.json")
 LOG_PATH = Path("/run/mattermost/update-mattermost-config.log")
+STAMP_PATH = Path("/var/lib/rave/update-mattermost-config.stamp")
+INPUT_ENV_PREFIXES = ("SITE_URL", "BRAND_HTML", "GITLAB_", "OPENID_")
 SITE_URL_DEFAULT = @SITE_URL@
 BRAND_TEXT_DEFAULT = @BRAND_TEXT@
-GITLAB_SETTINGS_DEFAULT = json.loads('@GITLAB_SETTINGS@')
+GITLAB_SETTINGS_DEFAULT = @GITLAB_SETTINGS@
 GITLAB_ENABLED_DEFAULT = @GITLAB_ENABLED_DEFAULT@
 SECRET_FALLBACK = @GITLAB_SECRET_FALLBACK@
-OPENID_SETTINGS_DEFAULT = json.loads('@OPENID_SETTINGS@')
+OPENID_SETTINGS_DEFAULT = @OPENID_SETTINGS@
 OPENID_ENABLED_DEFAULT = @OPENID_ENABLED_DEFAULT@
 OPENID_SECRET_FALLBACK = @OPENID_SECRET_FALLBACK@
 
@@ -42,13 +45,69 @@ def _trim(value: str, fallback: str) -> str:
     return candidate or fallback.rstrip("/")
 
 
+def _file_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size, stat.st_ino]
+
+
+def _input_fingerprint() -> str:
+    """Hash everything the rewrite depends on apart from config.json itself."""
+    env = sorted(
+        (key, value) for key, value in os.environ.items() if key.startswith(INPUT_ENV_PREFIXES)
+    )
+    secret_files = {
+        key: _file_signature(os.environ[key])
+        for key in ("GITLAB_SECRET_FILE", "OPENID_SECRET_FILE")
+        if os.environ.get(key, "").strip()
+    }
+    # The script lives in the Nix store, so its path changes with the baked-in defaults.
+    payload = json.dumps([os.path.abspath(__file__), env, secret_files])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _read_stamp():
+    try:
+        return json.loads(STAMP_PATH.read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _write_config(config: dict, current: os.stat_result) -> None:
+    """Replace config.json atomically so Mattermost never reads a partial file."""
+    payload = (json.dumps(config, indent=2) + "\n").encode("utf-8")
+    tmp_path = CONFIG_PATH.with_name(CONFIG_PATH.name + ".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, current.st_mode & 0o777)
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(payload)
+        handle.flush()
+        # Keep the original owner so the mattermost service can still write it.
+        os.fchown(handle.fileno(), current.st_uid, current.st_gid)
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, CONFIG_PATH)
+
+
 def main() -> None:
-    if not CONFIG_PATH.exists():
+    inputs = _input_fingerprint()
+
+    # One open for the existence check, the stat and the read; json accepts
+    # the raw bytes directly.
+    try:
+        with CONFIG_PATH.open("rb") as handle:
+            current = os.fstat(handle.fileno())
+            # Nothing changed since our last rewrite (Mattermost saving its own
+            # settings bumps the signature): skip the parse and rewrite.
+            stamp = {"inputs": inputs, "config": [current.st_mtime_ns, current.st_size, current.st_ino]}
+            if _read_stamp() == stamp:
+                LOG_PATH.write_text("noop\n")
+                return
+            config = json.loads(handle.read())
+    except FileNotFoundError:
         LOG_PATH.write_text("config.json missing\n")
         return
 
-    config = json.loads(CONFIG_PATH.read_text())
-
     site_url = os.environ.get("SITE_URL", SITE_URL_DEFAULT).rstrip("/")
     brand_html = os.environ.get("BRAND_HTML") or BRAND_TEXT_DEFAULT
     gitlab_enabled = _bool_env("GITLAB_ENABLED", GITLAB_ENABLED_DEFAULT)
@@ -114,8 +173,14 @@ def main() -> None:
 
     config.pop("GoogleSettings", None)
 
-    CONFIG_PATH.write_text(json.dumps(config, indent=2) + "\n")
+    _write_config(config, current)
     LOG_PATH.write_text("updated:" + ",".join(sections) + "\n")
+    try:
+        STAMP_PATH.write_text(
+            json.dumps({"inputs": inputs, "config": _file_signature(str(CONFIG_PATH))})
+        )
+    except OSError:
+        pass
 
 
 if __name__ == "__main__":
@@ -13,22 +13,65 @@ Security Features:
 
 import re
 import logging
+import string
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import List, Dict, Any, Optional, Union
+from typing import Callable, Iterable, List, Dict, Any, NamedTuple, Optional, Pattern, Tuple, Union
 import html
-import shlex
 
 import structlog
 
+# The dangerous-pattern scan runs on attacker-controlled text; prefer RE2's
+# linear-time engine when google-re2 is installed.
+try:
+    import re2 as _dangerous_re_engine
+except ImportError:  # pragma: no cover - optional dependency
+    _dangerous_re_engine = re
+
 logger = structlog.get_logger()
 
+# Characters allowed in agent names and simple name-like arguments
+AGENT_CHARS = frozenset(string.ascii_letters + string.digits + '-_')
+
+# Argument patterns of this exact shape are checked with _is_agent_name
+_NAME_ARG_PATTERN = re.compile(r'\^\[a-zA-Z0-9-_\]\{1,(\d+)\}\$')
+
+
+def _is_agent_name(value: str, maxlen: int = 50) -> bool:
+    """Check ``[a-zA-Z0-9-_]{1,maxlen}`` without the regex engine."""
+    return 0 < len(value) <= maxlen and AGENT_CHARS.issuperset(value)
+
+
+def _compile_arg_pattern(pattern: str) -> Tuple[Pattern[str], Optional[int]]:
+    """Compile an argument pattern for fullmatch.
+
+    Returns the compiled pattern and, for plain name patterns, their maximum
+    length so callers can use ``_is_agent_name`` instead.
+    """
+    name_pattern = _NAME_ARG_PATTERN.fullmatch(pattern)
+    compiled = re.compile(pattern.removeprefix('^').removesuffix('$'))
+    return compiled, int(name_pattern.group(1)) if name_pattern else None
+
 
 class CommandValidationError(Exception):
     """Raised when command validation fails."""
     pass
 
 
-@dataclass
+class CommandSpec(NamedTuple):
+    """Compiled form of a COMMAND_PATTERNS entry."""
+    description: str
+    pattern: str
+    min_args: int
+    max_args: int
+    # (compiled pattern, max length if it is a plain name pattern) per argument
+    arg_patterns: Tuple[Tuple[Pattern[str], Optional[int]], ...]
+
+
+@dataclass(frozen=True)
 class ParsedCommand:
     """Represents a parsed and validated command."""
     command: str
@@ -57,7 +100,7 @@ class SecureCommandParser:
             'max_args': 2,
             'arg_patterns': [
                 r'^[a-zA-Z0-9-_]{1,50}$',  # Agent type: alphanumeric, hyphens, underscores
-                r'^[a-zA-Z0-9=,\s-_]{0,200}$'  # Optional config: limited chars
+                r'^[a-zA-Z0-9=,\s_-]{0,200}$'  # Optional config: limited chars
             ],
             'description': 'Start an agent service'
         },
@@ -99,9 +142,43 @@ class SecureCommandParser:
         }
     }
     
+    # Compiled once per process; argument patterns lose their ^...$ anchors
+    # because they are applied with fullmatch.
+    _SPECS = {
+        cmd: CommandSpec(
+            description=info['description'],
+            pattern=info['pattern'],
+            min_args=info['min_args'],
+            max_args=info['max_args'],
+            arg_patterns=tuple(_compile_arg_pattern(p) for p in info.get('arg_patterns', [])),
+        )
+        for cmd, info in COMMAND_PATTERNS.items()
+    }
+    
+    # Successful parses are cached by raw text (bots and retries repeat
+    # commands); long inputs are never cached so garbage cannot fill it.
+    PARSE_CACHE_SIZE = 512
+    PARSE_CACHE_MAX_LENGTH = 256
+    
+    # Single characters to reject: shell metacharacters, line breaks and
+    # control characters. A set test is cheaper than a regex character class.
+    BAD_CHARS = frozenset(
+        ';&|`$(){}[]\\\r\n'
+        + ''.join(chr(c) for c in range(0x20))
+        + ''.join(chr(c) for c in range(0x7f, 0xa0))
+    )
+    
+    # Control characters that whitespace normalisation would not turn into
+    # spaces; these can be rejected before the command is copied at all
+    _CONTROL_CHARS = frozenset(
+        chr(c) for c in (*range(0x20), *range(0x7f, 0xa0)) if not chr(c).isspace()
+    )
+    
+    # Characters html.escape would rewrite
+    _HTML_UNSAFE = frozenset('&<>"\'')
+    
     # Security patterns to reject
     DANGEROUS_PATTERNS = [
-        r'[;&|`$(){}[\]\\]',  # Shell metacharacters
         r'\.\.',              # Directory traversal (basic)
         r'\.\..*\/',          # Path traversal with forward slash
         r'\.\..*\\',          # Path traversal with backslash
@@ -113,18 +190,34 @@ class SecureCommandParser:
         r'file://',           # File URLs
         r'\\x[0-9a-fA-F]{2}', # Hex escape sequences
         r'%[0-9a-fA-F]{2}',   # URL encoding
-        r'\r|\n',             # Line breaks
-        r'[\x00-\x1f\x7f-\x9f]',  # Control characters
     ]
     
-    def __init__(self, allowed_commands: Optional[List[str]] = None):
+    # Every DANGEROUS_PATTERNS match contains one of these characters; text
+    # without any of them cannot match, so the regex scan is skipped. Keep in
+    # sync when adding patterns.
+    _DANGEROUS_TRIGGERS = frozenset('./\\<:%')
+    
+    # All dangerous patterns as one alternation, so a command is scanned once
+    # (inline flags, so the pattern compiles unchanged under re and re2).
+    _DANGEROUS_RE = _dangerous_re_engine.compile(
+        '(?i)' + '|'.join(f'(?:{pattern})' for pattern in DANGEROUS_PATTERNS)
+    )
+    
+    def __init__(self, allowed_commands: Optional[List[str]] = None,
+                 record_timestamp: bool = True):
         """
         Initialize the secure command parser.
         
         Args:
             allowed_commands: List of allowed command names. If None, all defined commands are allowed.
+            record_timestamp: Stamp metadata['parsed_at'] on parsed commands.
         """
         self.log = logger.bind(component="command_parser")
+        self._record_timestamp = record_timestamp
+        # Decided once: a filtered debug call still builds its event dict
+        self._debug_enabled = (
+            self.log.isEnabledFor(logging.DEBUG) if hasattr(self.log, 'isEnabledFor') else False
+        )
         
         # Set allowed commands (default to all if not specified)
         if allowed_commands is None:
@@ -140,11 +233,22 @@ class SecureCommandParser:
         self.log.info("Command parser initialized", 
                      allowed_commands=list(self.allowed_commands))
         
-        # Compile dangerous patterns for performance
-        self.compiled_dangerous_patterns = [
-            re.compile(pattern, re.IGNORECASE | re.MULTILINE)
-            for pattern in self.DANGEROUS_PATTERNS
-        ]
+        # Help output only depends on the allowlist; build it once
+        self._allowed_commands_desc = {
+            cmd: self._SPECS[cmd].description
+            for cmd in self.allowed_commands
+        }
+        self._help_cache = {
+            cmd: self._build_command_help(cmd) for cmd in self.allowed_commands
+        }
+        
+        # One specialised argument validator per allowed command
+        self._validators: Dict[str, Callable[[List[str]], List[str]]] = {
+            cmd: self._build_validator(cmd) for cmd in self.allowed_commands
+        }
+        
+        self._parse_cache: "OrderedDict[str, Tuple[str, Tuple[str, ...]]]" = OrderedDict()
+        self._parse_cache_lock = threading.Lock()
     
     def parse_command(self, command_text: str) -> ParsedCommand:
         """
@@ -160,92 +264,221 @@ class SecureCommandParser:
             CommandValidationError: If validation fails
         """
         original_command = command_text
-        self.log.debug("Parsing command", command=command_text[:100])
+        if self._debug_enabled:
+            self.log.debug("Parsing command", command=command_text[:100])
+        
+        cached = self._get_cached_parse(command_text)
         
         try:
-            # 1. Basic validation
-            command_text = self._basic_validation(command_text)
-            
-            # 2. Security pattern checking
-            self._check_dangerous_patterns(command_text)
-            
-            # 3. Parse command structure
-            command, args = self._parse_structure(command_text)
-            
-            # 4. Validate command is allowed
-            if command not in self.allowed_commands:
-                raise CommandValidationError(f"Command not allowed: {command}")
-            
-            # 5. Pattern-based validation
-            self._validate_command_pattern(command, args, command_text)
-            
-            # 6. Argument validation
-            validated_args = self._validate_arguments(command, args)
-            
-            # 7. Create parsed command object
-            parsed_command = ParsedCommand(
-                command=command,
-                args=validated_args,
-                raw_command=original_command,
-                metadata={
-                    'parsed_at': self._get_timestamp(),
-                    'validation_passed': True,
-                    'arg_count': len(validated_args)
-                }
-            )
+            if cached is not None:
+                command, validated_args = cached[0], list(cached[1])
+            else:
+                # 1-2. Basic validation and allowlist check
+                command_text = self._prevalidate(command_text)
+                
+                # 3. Security pattern checking
+                self._check_dangerous_patterns(command_text)
+                
+                # 4-5. Parse structure and validate arguments
+                command, validated_args = self._validate_structure(original_command, command_text)
             
-            self.log.info("Command parsed successfully", 
-                         command=command, 
-                         arg_count=len(validated_args))
+            # 6. Create parsed command object
+            return self._accept(original_command, command, validated_args)
             
-            return parsed_command
+        except Exception as e:
+            error = self._reject(e, command_text)
+            if error is e:
+                raise
+            raise error
+    
+    def parse_many(self, texts: Iterable[str]) -> List[Union[ParsedCommand, CommandValidationError]]:
+        """
+        Parse a batch of commands, e.g. messages that arrived together.
+        
+        Args:
+            texts: Raw command texts
             
-        except CommandValidationError as e:
+        Returns:
+            For each input, in order, its ParsedCommand or the
+            CommandValidationError that rejected it. The dangerous-pattern
+            scan runs once over every text that passes basic validation.
+        """
+        texts = list(texts)
+        results: List[Any] = [None] * len(texts)
+        pending: List[Tuple[int, str]] = []
+        
+        for index, text in enumerate(texts):
+            cached = self._get_cached_parse(text)
+            if cached is not None:
+                results[index] = self._accept(text, cached[0], list(cached[1]))
+                continue
+            try:
+                pending.append((index, self._prevalidate(text)))
+            except Exception as e:
+                results[index] = self._reject(e, text)
+        
+        dangerous = self._find_dangerous([normalized for _, normalized in pending])
+        
+        for position, (index, normalized) in enumerate(pending):
+            try:
+                if position in dangerous:
+                    raise CommandValidationError(
+                        f"Dangerous pattern detected: {dangerous[position]!r}"
+                    )
+                command, validated_args = self._validate_structure(texts[index], normalized)
+                results[index] = self._accept(texts[index], command, validated_args)
+            except Exception as e:
+                results[index] = self._reject(e, normalized)
+        
+        return results
+    
+    def _prevalidate(self, command_text: str) -> str:
+        """Run basic validation and the allowlist check; return normalised text."""
+        command_text = self._basic_validation(command_text)
+        
+        # Reject unknown commands before any regex scanning
+        command_token = command_text[1:].split(' ', 1)[0].lower()
+        if command_token not in self.allowed_commands:
+            raise CommandValidationError(f"Command not allowed: {command_token}")
+        
+        return command_text
+    
+    def _validate_structure(self, original_command: str, command_text: str) -> Tuple[str, List[str]]:
+        """Tokenise and validate arguments of screened text, caching the result."""
+        command, args = self._parse_structure(command_text)
+        validated_args = self._validators[command](args)
+        self._cache_parse(original_command, command, validated_args)
+        return command, validated_args
+    
+    def _accept(self, original_command: str, command: str, validated_args: List[str]) -> ParsedCommand:
+        """Build the ParsedCommand for validated input and log it."""
+        metadata: Dict[str, Any] = {'arg_count': len(validated_args)}
+        if self._record_timestamp:
+            metadata['parsed_at'] = time.time()
+        parsed_command = ParsedCommand(
+            command=command,
+            args=validated_args,
+            raw_command=original_command,
+            metadata=metadata
+        )
+        
+        self.log.info("Command parsed successfully", 
+                     command=command, 
+                     arg_count=len(validated_args))
+        
+        return parsed_command
+    
+    def _reject(self, error: Exception, command_text: str) -> CommandValidationError:
+        """Log a failed parse; unexpected errors are wrapped."""
+        if isinstance(error, CommandValidationError):
             self.log.warning("Command validation failed", 
-                           error=str(e),
+                           error=str(error),
                            command=command_text[:100])
-            raise
+            return error
         
-        except Exception as e:
-            self.log.error("Unexpected error in command parsing", 
-                          error=str(e),
-                          command=command_text[:100])
-            raise CommandValidationError(f"Command parsing failed: {str(e)}")
+        self.log.error("Unexpected error in command parsing", 
+                      error=str(error),
+                      command=command_text[:100])
+        return CommandValidationError(f"Command parsing failed: {str(error)}")
+    
+    def _get_cached_parse(self, command_text: str) -> Optional[Tuple[str, Tuple[str, ...]]]:
+        """Return the cached (command, args) for a previously accepted text."""
+        with self._parse_cache_lock:
+            cached = self._parse_cache.get(command_text)
+            if cached is not None:
+                self._parse_cache.move_to_end(command_text)
+            return cached
+    
+    def _cache_parse(self, command_text: str, command: str, args: List[str]) -> None:
+        """Remember a successful parse, evicting the least recently used."""
+        if len(command_text) > self.PARSE_CACHE_MAX_LENGTH:
+            return
+        with self._parse_cache_lock:
+            self._parse_cache[command_text] = (command, tuple(args))
+            self._parse_cache.move_to_end(command_text)
+            if len(self._parse_cache) > self.PARSE_CACHE_SIZE:
+                self._parse_cache.popitem(last=False)
     
     def _basic_validation(self, command_text: str) -> str:
         """Perform basic command validation and sanitization."""
-        # Check length limits
+        # Check length limits, and reject control characters before any
+        # copying: hostile input fails here without a single allocation
         if len(command_text) > 1000:
             raise CommandValidationError("Command too long (max 1000 characters)")
         
-        if not command_text.strip():
+        if not self._CONTROL_CHARS.isdisjoint(command_text):
+            raise CommandValidationError("Command contains forbidden characters")
+        
+        command_text = command_text.strip()
+        if not command_text:
             raise CommandValidationError("Empty command")
         
         # Must start with !
-        if not command_text.strip().startswith('!'):
+        if not command_text.startswith('!'):
             raise CommandValidationError("Commands must start with !")
         
-        # Basic HTML escaping to prevent XSS if command is logged
-        command_text = html.escape(command_text.strip())
+        # Basic HTML escaping to prevent XSS if command is logged; most
+        # commands contain nothing to escape, so skip the copy for them
+        if not self._HTML_UNSAFE.isdisjoint(command_text):
+            command_text = html.escape(command_text)
         
-        # Remove excessive whitespace
-        command_text = re.sub(r'\s+', ' ', command_text)
+        # Remove excessive whitespace (str.split and \s agree on what it is)
+        command_text = ' '.join(command_text.split())
+        
+        if not self.BAD_CHARS.isdisjoint(command_text):
+            raise CommandValidationError("Command contains forbidden characters")
         
         return command_text
     
     def _check_dangerous_patterns(self, command_text: str) -> None:
         """Check for dangerous patterns in command text."""
-        for pattern in self.compiled_dangerous_patterns:
-            if pattern.search(command_text):
-                raise CommandValidationError(f"Dangerous pattern detected: {pattern.pattern}")
+        if self._DANGEROUS_TRIGGERS.isdisjoint(command_text):
+            return
+        match = self._DANGEROUS_RE.search(command_text)
+        if match:
+            raise CommandValidationError(f"Dangerous pattern detected: {match.group(0)!r}")
+    
+    def _find_dangerous(self, texts: List[str]) -> Dict[int, str]:
+        """Map the index of each text containing a dangerous pattern to its match.
+        
+        Candidates are joined with newlines (already rejected in commands) and
+        scanned in one pass. A hit is confirmed on its own text, since a match
+        may run across a separator, and scanning resumes at the next text.
+        """
+        candidates = [
+            index for index, text in enumerate(texts)
+            if not self._DANGEROUS_TRIGGERS.isdisjoint(text)
+        ]
+        if not candidates:
+            return {}
+        
+        starts = []
+        offset = 0
+        for index in candidates:
+            starts.append(offset)
+            offset += len(texts[index]) + 1
+        buffer = '\n'.join(texts[index] for index in candidates)
+        
+        flagged: Dict[int, str] = {}
+        position = 0
+        while position < len(starts):
+            match = self._DANGEROUS_RE.search(buffer, starts[position])
+            if not match:
+                break
+            position = bisect_right(starts, match.start()) - 1
+            index = candidates[position]
+            own_match = self._DANGEROUS_RE.search(texts[index])
+            if own_match:
+                flagged[index] = own_match.group(0)
+            position += 1
+        return flagged
     
     def _parse_structure(self, command_text: str) -> tuple[str, List[str]]:
         """Parse command structure into command and arguments."""
-        try:
-            # Use shlex for proper argument parsing
-            parts = shlex.split(command_text)
-        except ValueError as e:
-            raise CommandValidationError(f"Invalid command syntax: {str(e)}")
+        # Quotes and escapes are already rejected (quotes are HTML-escaped to
+        # entities containing & and ;), so whitespace splitting is all the
+        # tokenising this grammar needs.
+        parts = command_text.split()
         
         if not parts:
             raise CommandValidationError("Empty command")
@@ -256,98 +489,83 @@ class SecureCommandParser:
         
         return command, args
     
-    def _validate_command_pattern(self, command: str, args: List[str], full_command: str) -> None:
-        """Validate command matches expected pattern."""
-        if command not in self.COMMAND_PATTERNS:
-            raise CommandValidationError(f"Unknown command: {command}")
-        
-        pattern_info = self.COMMAND_PATTERNS[command]
-        pattern = re.compile(pattern_info['pattern'], re.IGNORECASE)
-        
-        if not pattern.match(full_command):
-            raise CommandValidationError(f"Command syntax error for {command}")
-        
-        # Validate argument count
-        min_args = pattern_info['min_args']
-        max_args = pattern_info['max_args']
-        
-        if len(args) < min_args:
-            raise CommandValidationError(f"Too few arguments for {command} (min: {min_args})")
+    def _build_validator(self, command: str) -> Callable[[List[str]], List[str]]:
+        """Build the argument validator for one command.
+
+        Count limits and per-argument checks are resolved here, once, so the
+        returned function does no pattern lookups or type dispatch per parse.
+        The command's full ``pattern`` is not used: it adds nothing beyond the
+        argument count and the per-argument patterns.
+        """
+        spec = self._SPECS[command]
+        min_args = spec.min_args
+        max_args = spec.max_args
+        
+        checks: List[Callable[[str], bool]] = []
+        for pattern, name_maxlen in spec.arg_patterns:
+            if name_maxlen is not None:
+                checks.append(lambda arg, maxlen=name_maxlen: _is_agent_name(arg, maxlen))
+            else:
+                checks.append(lambda arg, pattern=pattern: pattern.fullmatch(arg) is not None)
+        # Arguments past the declared patterns are only length-checked
+        checks.extend([lambda arg: True] * max(0, max_args - len(checks)))
         
-        if len(args) > max_args:
-            raise CommandValidationError(f"Too many arguments for {command} (max: {max_args})")
-    
-    def _validate_arguments(self, command: str, args: List[str]) -> List[str]:
-        """Validate and sanitize command arguments."""
-        pattern_info = self.COMMAND_PATTERNS[command]
-        arg_patterns = pattern_info.get('arg_patterns', [])
-        validated_args = []
-        
-        for i, arg in enumerate(args):
-            # Check if we have a pattern for this argument
-            if i < len(arg_patterns):
-                pattern = re.compile(arg_patterns[i])
-                if not pattern.match(arg):
+        def validate(args: List[str]) -> List[str]:
+            if len(args) < min_args:
+                raise CommandValidationError(f"Too few arguments for {command} (min: {min_args})")
+            
+            if len(args) > max_args:
+                raise CommandValidationError(f"Too many arguments for {command} (max: {max_args})")
+            
+            validated_args = []
+            for i, (check, arg) in enumerate(zip(checks, args)):
+                if not check(arg):
                     raise CommandValidationError(
                         f"Invalid argument {i+1} for {command}: {arg}"
                     )
-            
-            # Additional sanitization
-            sanitized_arg = self._sanitize_argument(arg)
-            validated_args.append(sanitized_arg)
-        
-        return validated_args
-    
-    def _sanitize_argument(self, arg: str) -> str:
-        """Sanitize individual argument."""
-        # Remove any null bytes
-        arg = arg.replace('\x00', '')
-        
-        # Limit length
-        if len(arg) > 200:
-            raise CommandValidationError(f"Argument too long: {arg[:50]}...")
-        
-        # Basic sanitization
-        arg = arg.strip()
-        
-        return arg
-    
-    def _get_timestamp(self) -> float:
-        """Get current timestamp."""
-        import time
-        return time.time()
+                # NULs and surrounding whitespace cannot reach this point:
+                # control characters are rejected and args come from split()
+                if len(arg) > 200:
+                    raise CommandValidationError(f"Argument too long: {arg[:50]}...")
+                validated_args.append(arg)
+            return validated_args
+        
+        return validate
     
     def get_allowed_commands(self) -> Dict[str, str]:
-        """Get dictionary of allowed commands and their descriptions."""
-        return {
-            cmd: self.COMMAND_PATTERNS[cmd]['description']
-            for cmd in self.allowed_commands
-            if cmd in self.COMMAND_PATTERNS
-        }
+        """Get dictionary of allowed commands and their descriptions.
+        
+        The dictionary is shared between calls; treat it as read-only.
+        """
+        return self._allowed_commands_desc
     
     def get_command_help(self, command: str) -> Optional[Dict[str, Any]]:
-        """Get help information for a specific command."""
-        if command not in self.allowed_commands or command not in self.COMMAND_PATTERNS:
-            return None
+        """Get help information for a specific command.
         
-        pattern_info = self.COMMAND_PATTERNS[command]
+        The dictionary is shared between calls; treat it as read-only.
+        """
+        return self._help_cache.get(command)
+    
+    def _build_command_help(self, command: str) -> Dict[str, Any]:
+        """Build the help entry for an allowed command."""
+        spec = self._SPECS[command]
         
         return {
             'command': command,
-            'description': pattern_info['description'],
-            'min_args': pattern_info['min_args'],
-            'max_args': pattern_info['max_args'],
-            'pattern': pattern_info['pattern'],
-            'usage': self._generate_usage(command, pattern_info)
+            'description': spec.description,
+            'min_args': spec.min_args,
+            'max_args': spec.max_args,
+            'pattern': spec.pattern,
+            'usage': self._generate_usage(command, spec)
         }
     
-    def _generate_usage(self, command: str, pattern_info: Dict[str, Any]) -> str:
+    def _generate_usage(self, command: str, spec: CommandSpec) -> str:
         """Generate usage string for a command."""
         # Simple usage generation based on min/max args
         base = f"!{command}"
         
-        min_args = pattern_info['min_args']
-        max_args = pattern_info['max_args']
+        min_args = spec.min_args
+        max_args = spec.max_args
         
         if command == 'start-agent':
             return f"{base} <agent-type> [config]"
@@ -373,12 +591,8 @@ class SecureCommandParser:
     
     def validate_agent_name(self, agent_name: str) -> bool:
         """Validate agent name format."""
-        if not agent_name:
-            return False
-        
         # Must be alphanumeric with hyphens/underscores only
-        pattern = re.compile(r'^[a-zA-Z0-9-_]{1,50}$')
-        return bool(pattern.match(agent_name))
+        return _is_agent_name(agent_name)
 
 
 # Security testing utilities
@@ -3,53 +3,129 @@ Adaptive Rate Limiter for Chat Control
 Implements sophisticated rate limiting with adaptive thresholds.
 
 Security Features:
-- Per-client rate limiting with sliding windows
+- Per-client rate limiting with token buckets (sliding windows in Redis)
 - Adaptive rate limiting based on system load
 - Burst capacity management
 - Distributed rate limiting support
 - Memory-efficient token bucket algorithm
 - Real-time metrics and monitoring
+
+Concurrency: local state is only touched from the event loop thread, and
+no code path awaits between reading and updating a client's metrics, so
+each check, cleanup pass and reset runs to completion without another
+coroutine interleaving. Keep it that way; an await inside those sections
+would need locking again.
 """
 
 import asyncio
+import logging
 import time
 import hashlib
+import itertools
 import os
 from dataclasses import dataclass
 from typing import Dict, Any, List, Optional, Set
-from collections import defaultdict, deque
+from collections import OrderedDict, deque
 import math
 
 import structlog
 
 logger = structlog.get_logger()
 
+_HAS_LOADAVG = hasattr(os, 'getloadavg')
+
+# Upper bound on ClientMetrics kept for reuse after cleanup
+_METRICS_POOL_LIMIT = 1024
+
+# Limit multipliers by request context; user type takes precedence
+_USER_TYPE_FACTORS = {'admin': 2.0}  # Higher limits for admins
+_REQUEST_TYPE_FACTORS = {'status': 1.5}  # Higher limits for status requests
+
+
+def _refill_tokens(
+    tokens: float,
+    last_time: float,
+    now: float,
+    limits: Dict[str, Any]
+) -> float:
+    """Return a bucket's tokens after refilling it since last_time."""
+    if last_time:
+        # requests_per_minute / 60 tokens per second
+        tokens += (now - last_time) * limits['requests_per_minute'] / 60.0
+    capacity = limits['burst_size']
+    return capacity if tokens > capacity else tokens
+
+# Redis Lua script for atomic rate limiting
+RATE_LIMIT_SCRIPT = """
+local window_key = KEYS[1]
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local window_size = tonumber(ARGV[3])
+local rate_limit = tonumber(ARGV[4])
+local burst_limit = tonumber(ARGV[5])
+local member = ARGV[6]  -- unique per call, generated by the client
+
+-- Drop requests that left the window, then check the window rate
+redis.call('ZREMRANGEBYSCORE', window_key, '-inf', now - window_size)
+if redis.call('ZCARD', window_key) + cost > rate_limit then
+    return 0  -- Rate limit exceeded
+end
+
+-- Burst: no more than burst_limit requests within the time a token bucket
+-- of that size takes to refill at rate_limit per minute
+local burst_window = burst_limit * 60 / rate_limit
+if redis.call('ZCOUNT', window_key, now - burst_window, '+inf') + cost > burst_limit then
+    return 0  -- Burst limit exceeded
+end
 
-@dataclass
+-- Allow request
+if cost == 1 then
+    redis.call('ZADD', window_key, now, member)
+else
+    for i = 1, cost do
+        redis.call('ZADD', window_key, now, member .. ':' .. i)
+    end
+end
+redis.call('EXPIRE', window_key, window_size + 10)
+
+return 1  -- Allowed
+"""
+# Redis caches scripts by SHA1, so the digest can be computed locally
+RATE_LIMIT_SCRIPT_SHA = hashlib.sha1(RATE_LIMIT_SCRIPT.encode()).hexdigest()
+
+
+@dataclass(slots=True)
 class RateLimitConfig:
     """Rate limiting configuration."""
     requests_per_minute: int
     burst_size: int
     window_size: int = 60  # seconds
     cleanup_interval: int = 300  # 5 minutes
+    load_sample_interval: int = 5  # seconds
+    redis_timeout: float = 0.05  # seconds per Redis call
+    redis_failure_threshold: int = 3  # consecutive failures before skipping Redis
+    redis_retry_interval: float = 5.0  # seconds to use local limiting after that
     adaptive_enabled: bool = True
     max_burst_multiplier: float = 2.0
     min_rate_multiplier: float = 0.1
 
 
-@dataclass
+@dataclass(slots=True)
 class ClientMetrics:
-    """Per-client rate limiting metrics."""
+    """Per-client rate limiting metrics; times are time.monotonic() values."""
     requests_made: int = 0
     requests_blocked: int = 0
     last_request_time: float = 0.0
     burst_tokens: float = 0.0
     window_start: float = 0.0
-    request_times: deque = None
     
-    def __post_init__(self):
-        if self.request_times is None:
-            self.request_times = deque(maxlen=100)  # Keep last 100 request times
+    def reset(self) -> None:
+        """Clear all counters so the object can track a new client."""
+        self.requests_made = 0
+        self.requests_blocked = 0
+        self.last_request_time = 0.0
+        self.burst_tokens = 0.0
+        self.window_start = 0.0
 
 
 class AdaptiveRateLimiter:
@@ -57,8 +133,7 @@ class AdaptiveRateLimiter:
     Adaptive rate limiter with sophisticated controls and system load awareness.
     
     Features:
-    - Token bucket algorithm with burst capacity
-    - Sliding window rate limiting
+    - Token bucket algorithm with burst capacity, refilled at the per-minute rate
     - Adaptive rate adjustment based on system load
     - Per-client tracking and metrics
     - Memory-efficient cleanup
@@ -91,29 +166,46 @@ class AdaptiveRateLimiter:
         )
         
         self.redis_client = redis_client
+        # Consecutive Redis failures and, once they reach the threshold, the
+        # monotonic time until which checks stay local
+        self._redis_failures = 0
+        self._redis_retry_at = 0.0
+        # Sorted set members must be unique across every limiter sharing
+        # Redis: a random per-instance prefix plus a local counter
+        self._member_prefix = os.urandom(4).hex()
+        self._member_ids = itertools.count()
         self.log = logger.bind(component="rate_limiter")
+        self._debug_enabled = (
+            self.log.isEnabledFor(logging.DEBUG) if hasattr(self.log, 'isEnabledFor') else False
+        )
         
-        # Client tracking
-        self._client_metrics: Dict[str, ClientMetrics] = {}
-        self._client_lock = asyncio.Lock()
+        # Client tracking, ordered from least to most recently checked
+        self._client_metrics: OrderedDict[str, ClientMetrics] = OrderedDict()
+        # Monotonic time until which a blocked client is refused outright
+        self._deny_until: Dict[str, float] = {}
+        # Metrics of cleaned up clients, reused for new clients
+        self._metrics_pool: List[ClientMetrics] = []
         
         # System metrics for adaptive limiting
         self._system_load_history: deque = deque(maxlen=60)  # 1 minute of history
         self._current_load_factor = 1.0
-        self._last_load_check = 0.0
         
-        # Cleanup task
+        # Limits without request context only depend on the load factor, so
+        # they are computed once per load factor change
+        self._cached_limits: Optional[Dict[str, Any]] = None
+        self._cached_limits_load_factor: Optional[float] = None
+        
+        # Background tasks
         self._cleanup_task: Optional[asyncio.Task] = None
+        self._load_task: Optional[asyncio.Task] = None
         self._is_running = False
         
         # Global statistics
-        self._stats = {
-            'total_requests': 0,
-            'total_blocked': 0,
-            'total_allowed': 0,
-            'active_clients': 0,
-            'avg_system_load': 0.0
-        }
+        self._total_requests = 0
+        self._total_blocked = 0
+        self._total_allowed = 0
+        self._active_clients = 0
+        self._avg_system_load = 0.0
         
         self.log.info("Rate limiter initialized",
                      rpm=requests_per_minute,
@@ -124,6 +216,16 @@ class AdaptiveRateLimiter:
         """Start the rate limiter background tasks."""
         self._is_running = True
         self._cleanup_task = asyncio.create_task(self._cleanup_worker())
+        if self.config.adaptive_enabled:
+            self._load_task = asyncio.create_task(self._load_sampler())
+        
+        if self.redis_client:
+            # Preload so rate checks can call the script by SHA; if Redis is
+            # unavailable now, the first EVALSHA miss loads it instead
+            try:
+                await self.redis_client.script_load(RATE_LIMIT_SCRIPT)
+            except Exception as e:
+                self.log.warning("Failed to preload rate limit script", error=str(e))
         
         self.log.info("Rate limiter started")
     
@@ -131,12 +233,13 @@ class AdaptiveRateLimiter:
         """Stop the rate limiter and cleanup resources."""
         self._is_running = False
         
-        if self._cleanup_task:
-            self._cleanup_task.cancel()
-            try:
-                await self._cleanup_task
-            except asyncio.CancelledError:
-                pass
+        for task in (self._cleanup_task, self._load_task):
+            if task:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
         
         self.log.info("Rate limiter stopped")
     
@@ -157,12 +260,21 @@ class AdaptiveRateLimiter:
         Returns:
             bool: True if request is allowed
         """
-        now = time.time()
+        now = time.monotonic()
+        
+        # Clients retrying before they could possibly pass are refused without
+        # another bucket update
+        deny_until = self._deny_until.get(client_id)
+        if deny_until is not None:
+            if now < deny_until:
+                self._total_blocked += 1
+                metrics = self._client_metrics.get(client_id)
+                if metrics is not None:
+                    metrics.requests_blocked += 1
+                return False
+            del self._deny_until[client_id]
         
         try:
-            # Update system load for adaptive limiting
-            await self._update_system_load()
-            
             # Use distributed limiting if Redis is available
             if self.redis_client:
                 return await self._is_allowed_distributed(client_id, cost, now)
@@ -184,118 +296,78 @@ class AdaptiveRateLimiter:
         context: Optional[Dict[str, Any]] = None
     ) -> bool:
         """Check rate limit using local state."""
-        async with self._client_lock:
-            # Get or create client metrics
-            if client_id not in self._client_metrics:
-                self._client_metrics[client_id] = ClientMetrics(
+        metrics = self._client_metrics.get(client_id)
+        if metrics is None:
+            if self._metrics_pool:
+                metrics = self._metrics_pool.pop()
+                metrics.window_start = now
+                metrics.burst_tokens = self.config.burst_size
+            else:
+                metrics = ClientMetrics(
                     window_start=now,
-                    burst_tokens=self.config.burst_size
+                    burst_tokens=self.config.burst_size,
                 )
+            self._client_metrics[client_id] = metrics
+        else:
+            # Keeps the dict sorted by last_request_time for cleanup
+            self._client_metrics.move_to_end(client_id)
+        
+        # Calculate current rate limits (with adaptive adjustment)
+        current_limits = self._calculate_adaptive_limits(context)
+        
+        # Refill the token bucket up to now; blocked checks advance the
+        # refill time too, so the same interval is never credited twice
+        tokens = _refill_tokens(
+            metrics.burst_tokens, metrics.last_request_time, now, current_limits
+        )
+        metrics.last_request_time = now
+        
+        # Check burst capacity
+        if tokens < cost:
+            # Not enough burst tokens
+            metrics.burst_tokens = tokens
+            if tokens < 1:
+                # Nothing can pass before a whole token has refilled
+                self._deny_until[client_id] = now + (
+                    (1 - tokens) * 60.0 / current_limits['requests_per_minute']
+                )
+            metrics.requests_blocked += 1
+            self._total_blocked += 1
             
-            metrics = self._client_metrics[client_id]
-            
-            # Calculate current rate limits (with adaptive adjustment)
-            current_limits = self._calculate_adaptive_limits(context)
-            
-            # Update burst tokens (token bucket refill)
-            self._refill_burst_tokens(metrics, now, current_limits)
-            
-            # Check burst capacity
-            if metrics.burst_tokens < cost:
-                # Not enough burst tokens
-                metrics.requests_blocked += 1
-                self._stats['total_blocked'] += 1
-                
+            if self._debug_enabled:
                 self.log.debug("Request blocked - burst limit",
                              client_id=client_id,
-                             burst_tokens=metrics.burst_tokens,
+                             burst_tokens=tokens,
                              cost=cost)
-                return False
-            
-            # Check sliding window rate
-            if not self._check_sliding_window(metrics, now, current_limits, cost):
-                metrics.requests_blocked += 1
-                self._stats['total_blocked'] += 1
-                
-                self.log.debug("Request blocked - rate limit",
-                             client_id=client_id,
-                             window_requests=len(metrics.request_times))
-                return False
-            
-            # Allow request - consume tokens and update metrics
-            metrics.burst_tokens -= cost
-            metrics.requests_made += 1
-            metrics.last_request_time = now
-            metrics.request_times.append(now)
-            
-            self._stats['total_requests'] += 1
-            self._stats['total_allowed'] += 1
-            
-            return True
+            return False
+        
+        # Allow request - consume tokens and update metrics
+        metrics.burst_tokens = tokens - cost
+        metrics.requests_made += 1
+        
+        self._total_requests += 1
+        self._total_allowed += 1
+        
+        return True
     
     async def _is_allowed_distributed(
         self, 
         client_id: str, 
-        cost: int, 
-        now: float
+        cost: int,
+        local_now: float
     ) -> bool:
         """Check rate limit using Redis for distributed limiting."""
+        if local_now < self._redis_retry_at:
+            return await self._is_allowed_local(client_id, cost, local_now)
+        
+        # The sorted set is shared between processes and hosts, so its scores
+        # use wall clock time; local state uses the monotonic clock
+        now = time.time()
+        timeout = self.config.redis_timeout
+        
         try:
-            # Redis Lua script for atomic rate limiting
-            lua_script = """
-            local client_key = KEYS[1]
-            local window_key = KEYS[2]
-            local now = tonumber(ARGV[1])
-            local cost = tonumber(ARGV[2])
-            local window_size = tonumber(ARGV[3])
-            local rate_limit = tonumber(ARGV[4])
-            local burst_limit = tonumber(ARGV[5])
-            
-            -- Get current burst tokens
-            local burst_tokens = redis.call('GET', client_key)
-            if not burst_tokens then
-                burst_tokens = burst_limit
-            else
-                burst_tokens = tonumber(burst_tokens)
-            end
-            
-            -- Refill burst tokens based on time passed
-            local last_refill = redis.call('GET', client_key .. ':last_refill')
-            if last_refill then
-                local time_passed = now - tonumber(last_refill)
-                local refill_amount = (time_passed * rate_limit) / 60
-                burst_tokens = math.min(burst_limit, burst_tokens + refill_amount)
-            end
-            
-            -- Check if enough tokens
-            if burst_tokens < cost then
-                return 0  -- Not allowed
-            end
-            
-            -- Check sliding window
-            local window_start = now - window_size
-            redis.call('ZREMRANGEBYSCORE', window_key, 0, window_start)
-            local current_requests = redis.call('ZCARD', window_key)
-            
-            if current_requests >= rate_limit then
-                return 0  -- Rate limit exceeded
-            end
-            
-            -- Allow request
-            burst_tokens = burst_tokens - cost
-            redis.call('SET', client_key, burst_tokens, 'EX', window_size * 2)
-            redis.call('SET', client_key .. ':last_refill', now, 'EX', window_size * 2)
-            redis.call('ZADD', window_key, now, now .. ':' .. math.random())
-            redis.call('EXPIRE', window_key, window_size)
-            
-            return 1  -- Allowed
-            """
-            
             # Execute script
-            keys = [
-                f"rate_limit:{client_id}:burst",
-                f"rate_limit:{client_id}:window"
-            ]
+            keys = [f"rate_limit:{client_id}:window"]
             
             current_limits = self._calculate_adaptive_limits()
             
@@ -304,36 +376,80 @@ class AdaptiveRateLimiter:
                 cost,
                 self.config.window_size,
                 current_limits['requests_per_minute'],
-                current_limits['burst_size']
+                current_limits['burst_size'],
+                f"{self._member_prefix}:{next(self._member_ids)}"
             ]
             
             # SECURITY NOTE: redis.eval() executes Lua scripts on Redis server, not Python eval()
             # This is secure as we control the Lua script content and Redis sandboxes it
-            result = await self.redis_client.eval(lua_script, keys, args)
+            try:
+                result = await asyncio.wait_for(
+                    self.redis_client.evalsha(RATE_LIMIT_SCRIPT_SHA, keys, args),
+                    timeout,
+                )
+            except Exception as e:
+                # redis-py raises NoScriptError and strips the NOSCRIPT
+                # prefix from its message; other clients keep it
+                if type(e).__name__ != 'NoScriptError' and 'NOSCRIPT' not in str(e):
+                    raise
+                # Redis restarted or flushed its script cache; EVAL reloads it
+                # under the same SHA, so later calls go back to EVALSHA
+                result = await asyncio.wait_for(
+                    self.redis_client.eval(RATE_LIMIT_SCRIPT, keys, args),
+                    timeout,
+                )
             
+            self._redis_failures = 0
             allowed = result == 1
             
             # Update local statistics
-            self._stats['total_requests'] += 1
+            self._total_requests += 1
             if allowed:
-                self._stats['total_allowed'] += 1
+                self._total_allowed += 1
             else:
-                self._stats['total_blocked'] += 1
+                self._total_blocked += 1
             
             return allowed
             
         except Exception as e:
             self.log.error("Redis rate limiting failed", 
                          client_id=client_id, 
-                         error=str(e))
+                         error=str(e) or type(e).__name__)
+            
+            # Stop waiting on a slow or unreachable Redis for a while
+            self._redis_failures += 1
+            if self._redis_failures >= self.config.redis_failure_threshold:
+                self._redis_failures = 0
+                self._redis_retry_at = local_now + self.config.redis_retry_interval
+                self.log.warning("Using local rate limiting while Redis is failing",
+                               retry_in=self.config.redis_retry_interval)
+            
             # Fallback to local limiting
-            return await self._is_allowed_local(client_id, cost, now)
+            return await self._is_allowed_local(client_id, cost, local_now)
     
     def _calculate_adaptive_limits(
         self, 
         context: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
-        """Calculate current rate limits with adaptive adjustment."""
+        """Calculate current rate limits with adaptive adjustment.
+        
+        The context-free result is cached and shared between callers, so it
+        must not be mutated.
+        """
+        if not context:
+            if (self._cached_limits is not None
+                    and self._cached_limits_load_factor == self._current_load_factor):
+                return self._cached_limits
+            self._cached_limits = self._compute_adaptive_limits(None)
+            self._cached_limits_load_factor = self._current_load_factor
+            return self._cached_limits
+        
+        return self._compute_adaptive_limits(context)
+    
+    def _compute_adaptive_limits(
+        self, 
+        context: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         base_rpm = self.config.requests_per_minute
         base_burst = self.config.burst_size
         
@@ -349,11 +465,11 @@ class AdaptiveRateLimiter:
         # Apply context-specific adjustments
         context_factor = 1.0
         if context:
-            # Adjust for request type, user type, etc.
-            if context.get('user_type') == 'admin':
-                context_factor = 2.0  # Higher limits for admins
-            elif context.get('request_type') == 'status':
-                context_factor = 1.5  # Higher limits for status requests
+            context_factor = (
+                _USER_TYPE_FACTORS.get(context.get('user_type'))
+                or _REQUEST_TYPE_FACTORS.get(context.get('request_type'))
+                or 1.0
+            )
         
         # Calculate adjusted limits
         total_factor = load_factor * context_factor
@@ -381,54 +497,23 @@ class AdaptiveRateLimiter:
             'context_factor': context_factor
         }
     
-    def _refill_burst_tokens(
-        self, 
-        metrics: ClientMetrics, 
-        now: float, 
-        limits: Dict[str, Any]
-    ) -> None:
-        """Refill burst tokens based on time elapsed."""
-        if metrics.last_request_time == 0:
-            metrics.last_request_time = now
-            return
-        
-        time_passed = now - metrics.last_request_time
-        refill_rate = limits['requests_per_minute'] / 60.0  # tokens per second
-        
-        tokens_to_add = time_passed * refill_rate
-        metrics.burst_tokens = min(
-            limits['burst_size'],
-            metrics.burst_tokens + tokens_to_add
-        )
-    
-    def _check_sliding_window(
-        self, 
-        metrics: ClientMetrics, 
-        now: float, 
-        limits: Dict[str, Any],
-        cost: int
-    ) -> bool:
-        """Check sliding window rate limit."""
-        # Clean old requests outside window
-        window_start = now - self.config.window_size
-        while metrics.request_times and metrics.request_times[0] < window_start:
-            metrics.request_times.popleft()
-        
-        # Check if adding this request would exceed limit
-        current_requests = len(metrics.request_times)
-        return current_requests + cost <= limits['requests_per_minute']
+    async def _load_sampler(self) -> None:
+        """Background worker sampling system load for adaptive limiting."""
+        while self._is_running:
+            try:
+                await self._update_system_load()
+                await asyncio.sleep(self.config.load_sample_interval)
+                
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                self.log.error("Error in load sampler", error=str(e))
     
     async def _update_system_load(self) -> None:
         """Update system load factor for adaptive limiting."""
-        now = time.time()
-        
-        # Update load every 5 seconds
-        if now - self._last_load_check < 5:
-            return
-        
         try:
             # Get system load average
-            load_avg = os.getloadavg()[0] if hasattr(os, 'getloadavg') else 1.0
+            load_avg = os.getloadavg()[0] if _HAS_LOADAVG else 1.0
             
             # Get CPU count for normalization
             cpu_count = os.cpu_count() or 1
@@ -442,20 +527,25 @@ class AdaptiveRateLimiter:
             avg_load = sum(self._system_load_history) / len(self._system_load_history)
             
             if avg_load < 0.5:
-                self._current_load_factor = 1.2  # Increase limits
+                load_factor = 1.2  # Increase limits
             elif avg_load < 0.8:
-                self._current_load_factor = 1.0  # Normal limits
+                load_factor = 1.0  # Normal limits
             elif avg_load < 1.2:
-                self._current_load_factor = 0.8  # Reduce limits
+                load_factor = 0.8  # Reduce limits
             else:
-                self._current_load_factor = 0.5  # Severely reduce limits
+                load_factor = 0.5  # Severely reduce limits
+            
+            if load_factor != self._current_load_factor:
+                self._current_load_factor = load_factor
+                self._cached_limits = None
             
-            self._last_load_check = now
-            self._stats['avg_system_load'] = avg_load
+            self._avg_system_load = avg_load
             
         except Exception as e:
             self.log.warning("Failed to update system load", error=str(e))
-            self._current_load_factor = 1.0
+            if self._current_load_factor != 1.0:
+                self._current_load_factor = 1.0
+                self._cached_limits = None
     
     async def _cleanup_worker(self) -> None:
         """Background worker to clean up old client data."""
@@ -471,58 +561,77 @@ class AdaptiveRateLimiter:
     
     async def _cleanup_old_clients(self) -> None:
         """Remove old inactive clients to free memory."""
-        now = time.time()
+        now = time.monotonic()
         cutoff = now - self.config.cleanup_interval * 2  # 2x cleanup interval
         
-        async with self._client_lock:
-            clients_to_remove = []
-            
-            for client_id, metrics in self._client_metrics.items():
-                if metrics.last_request_time < cutoff:
-                    clients_to_remove.append(client_id)
-            
-            for client_id in clients_to_remove:
-                del self._client_metrics[client_id]
-            
-            # Update statistics
-            self._stats['active_clients'] = len(self._client_metrics)
-            
-            if clients_to_remove:
-                self.log.debug("Cleaned up old clients", 
-                             count=len(clients_to_remove))
+        # Clients are ordered by last check, so stale ones are at the front
+        clients_to_remove = []
+        for client_id, metrics in self._client_metrics.items():
+            if metrics.last_request_time >= cutoff:
+                break
+            clients_to_remove.append(client_id)
+        
+        for client_id in clients_to_remove:
+            metrics = self._client_metrics.pop(client_id)
+            if len(self._metrics_pool) < _METRICS_POOL_LIMIT:
+                metrics.reset()
+                self._metrics_pool.append(metrics)
+        
+        # Drop expired denials
+        self._deny_until = {
+            client_id: deny_until
+            for client_id, deny_until in self._deny_until.items()
+            if deny_until > now
+        }
+        
+        # Update statistics
+        self._active_clients = len(self._client_metrics)
+        
+        if clients_to_remove:
+            self.log.debug("Cleaned up old clients", 
+                         count=len(clients_to_remove))
     
     async def get_client_info(self, client_id: str) -> Optional[Dict[str, Any]]:
         """Get rate limiting info for a specific client."""
-        async with self._client_lock:
-            if client_id not in self._client_metrics:
-                return None
-            
-            metrics = self._client_metrics[client_id]
-            now = time.time()
-            
-            # Calculate current limits
-            current_limits = self._calculate_adaptive_limits()
-            
-            # Update burst tokens for display
-            self._refill_burst_tokens(metrics, now, current_limits)
-            
-            return {
-                'client_id': client_id,
-                'requests_made': metrics.requests_made,
-                'requests_blocked': metrics.requests_blocked,
-                'burst_tokens_available': metrics.burst_tokens,
-                'window_requests': len(metrics.request_times),
-                'last_request': metrics.last_request_time,
-                'current_limits': current_limits,
-                'blocked_ratio': (
-                    metrics.requests_blocked / max(1, metrics.requests_made + metrics.requests_blocked)
-                )
-            }
+        metrics = self._client_metrics.get(client_id)
+        if metrics is None:
+            return None
+        
+        now = time.monotonic()
+        
+        # Calculate current limits
+        current_limits = self._calculate_adaptive_limits()
+        
+        # Tokens available right now, without touching the client's bucket
+        tokens = _refill_tokens(
+            metrics.burst_tokens, metrics.last_request_time, now, current_limits
+        )
+        
+        return {
+            'client_id': client_id,
+            'requests_made': metrics.requests_made,
+            'requests_blocked': metrics.requests_blocked,
+            'burst_tokens_available': tokens,
+            'window_requests': max(0, int(current_limits['burst_size'] - tokens)),
+            # Report the monotonic timestamp as epoch seconds
+            'last_request': (
+                time.time() - (now - metrics.last_request_time)
+                if metrics.last_request_time else 0.0
+            ),
+            'current_limits': dict(current_limits),
+            'blocked_ratio': (
+                metrics.requests_blocked / max(1, metrics.requests_made + metrics.requests_blocked)
+            )
+        }
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get rate limiter statistics."""
         return {
-            **self._stats,
+            'total_requests': self._total_requests,
+            'total_blocked': self._total_blocked,
+            'total_allowed': self._total_allowed,
+            'active_clients': self._active_clients,
+            'avg_system_load': self._avg_system_load,
             'config': {
                 'base_rpm': self.config.requests_per_minute,
                 'base_burst': self.config.burst_size,
@@ -534,22 +643,18 @@ class AdaptiveRateLimiter:
                 'system_load_samples': len(self._system_load_history)
             },
             'memory_usage': {
-                'tracked_clients': len(self._client_metrics),
-                'total_request_history': sum(
-                    len(metrics.request_times) 
-                    for metrics in self._client_metrics.values()
-                )
+                'tracked_clients': len(self._client_metrics)
             }
         }
     
     async def reset_client(self, client_id: str) -> bool:
         """Reset rate limiting state for a client."""
-        async with self._client_lock:
-            if client_id in self._client_metrics:
-                del self._client_metrics[client_id]
-                self.log.info("Reset rate limit state", client_id=client_id)
-                return True
-            return False
+        self._deny_until.pop(client_id, None)
+        if client_id in self._client_metrics:
+            del self._client_metrics[client_id]
+            self.log.info("Reset rate limit state", client_id=client_id)
+            return True
+        return False
     
     async def set_client_limits(
         self, 
@@ -0,0 +1,30 @@
+"""Tests for subprocess helpers."""
+from __future__ import annotations
+
+import io
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+CLI_DIR = Path(__file__).resolve().parents[2] / "apps" / "cli"
+if str(CLI_DIR) not in sys.path:
+    sys.path.insert(0, str(CLI_DIR))
+
+from process_utils import run_streamed  # noqa: E402
+
+
+class RunStreamedTests(unittest.TestCase):
+    def test_keeps_only_stderr_tail(self) -> None:
+        script = "import sys\nfor i in range(50): print(f'line {i}', file=sys.stderr)\nsys.exit(3)"
+        echoed = io.StringIO()
+        with mock.patch("process_utils.sys.stderr", echoed):
+            result = run_streamed([sys.executable, "-c", script], tail_lines=5)
+
+        self.assertEqual(result.returncode, 3)
+        self.assertEqual(result.stderr.splitlines(), [f"line {i}" for i in range(45, 50)])
+        self.assertEqual(len(echoed.getvalue().splitlines()), 50)
+
+
+if __name__ == "__main__":
+    unittest.main()
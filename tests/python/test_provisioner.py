@@ -0,0 +1,97 @@
+"""Tests for image provisioning helpers."""
+from __future__ import annotations
+
+import struct
+import subprocess
+import sys
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+from unittest import mock
+
+CLI_DIR = Path(__file__).resolve().parents[2] / "apps" / "cli"
+if str(CLI_DIR) not in sys.path:
+    sys.path.insert(0, str(CLI_DIR))
+
+import provisioner  # noqa: E402
+from provisioner import _data_partition_offsets  # noqa: E402
+
+LINUX_FS = uuid.UUID("0FC63DAF-8483-4772-8E79-3D69D8477DE4").bytes_le
+EFI_SYSTEM = uuid.UUID("C12A7328-F81F-11D2-BA4B-00A0C93EC93B").bytes_le
+
+
+def _mbr(partitions) -> bytearray:
+    sector = bytearray(512)
+    for index, (ptype, start_lba) in enumerate(partitions):
+        entry = 446 + 16 * index
+        sector[entry + 4] = ptype
+        struct.pack_into("<I", sector, entry + 8, start_lba)
+    sector[510:512] = b"\x55\xaa"
+    return sector
+
+
+class DataPartitionOffsetTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.image = Path(self._tmpdir.name) / "disk.raw"
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_reads_gpt_and_skips_boot_partitions(self) -> None:
+        header = bytearray(512)
+        header[:8] = b"EFI PART"
+        struct.pack_into("<QII", header, 72, 2, 4, 128)
+        table = bytearray(4 * 128)
+        table[0:16] = EFI_SYSTEM
+        struct.pack_into("<Q", table, 32, 2048)
+        table[128:144] = LINUX_FS
+        struct.pack_into("<Q", table, 128 + 32, 1050624)
+        self.image.write_bytes(bytes(_mbr([(0xEE, 1)]) + header + table))
+
+        self.assertEqual(_data_partition_offsets(str(self.image)), [1050624 * 512])
+
+    def test_reads_legacy_mbr_linux_partitions(self) -> None:
+        self.image.write_bytes(bytes(_mbr([(0x82, 63), (0x83, 4096)])))
+        self.assertEqual(_data_partition_offsets(str(self.image)), [4096 * 512])
+
+    def test_truncated_gpt_raises(self) -> None:
+        header = bytearray(512)
+        header[:8] = b"EFI PART"
+        struct.pack_into("<QII", header, 72, 2, 128, 128)
+        self.image.write_bytes(bytes(_mbr([(0xEE, 1)]) + header))
+        with self.assertRaises(ValueError):
+            _data_partition_offsets(str(self.image))
+
+
+
+class InjectSshKeySimpleTests(unittest.TestCase):
+    def _run_with_converted_image(self, raw_bytes):
+        def fake_run(cmd, **_kwargs):
+            if cmd[:2] == ["qemu-img", "convert"] and raw_bytes is not None:
+                Path(cmd[-1]).write_bytes(raw_bytes)
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+
+        fallback = {"success": True, "method": "cloud_init"}
+        with mock.patch("provisioner.subprocess.run", side_effect=fake_run), mock.patch(
+            "provisioner.inject_ssh_key_cloud_init", return_value=fallback
+        ) as cloud_init:
+            result = provisioner.inject_ssh_key_simple("/images/acme.qcow2", "ssh-ed25519 KEY")
+        cloud_init.assert_called_once_with("/images/acme.qcow2", "ssh-ed25519 KEY")
+        return result
+
+    def test_malformed_partition_table_falls_back_to_cloud_init(self) -> None:
+        header = bytearray(512)
+        header[:8] = b"EFI PART"
+        struct.pack_into("<QII", header, 72, 2, 128, 128)
+        result = self._run_with_converted_image(bytes(_mbr([(0xEE, 1)]) + header))
+        self.assertEqual(result["method"], "cloud_init")
+
+    def test_missing_converted_image_falls_back_to_cloud_init(self) -> None:
+        result = self._run_with_converted_image(None)
+        self.assertEqual(result["method"], "cloud_init")
+
+
+if __name__ == "__main__":
+    unittest.main()
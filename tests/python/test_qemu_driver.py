@@ -0,0 +1,57 @@
+"""Tests for QEMU command generation."""
+from __future__ import annotations
+
+import struct
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+CLI_DIR = Path(__file__).resolve().parents[2] / "apps" / "cli"
+if str(CLI_DIR) not in sys.path:
+    sys.path.insert(0, str(CLI_DIR))
+
+import qemu_driver  # noqa: E402
+
+
+class DriveOptionTests(unittest.TestCase):
+    def test_missing_image_keeps_host_cache(self) -> None:
+        option = qemu_driver._drive_option("/nonexistent/acme.raw")
+        self.assertEqual(option, "file=/nonexistent/acme.raw,format=raw")
+
+    def test_direct_io_uses_cache_none(self) -> None:
+        with tempfile.NamedTemporaryFile(suffix=".qcow2") as image, mock.patch(
+            "qemu_driver.os.open", return_value=99
+        ), mock.patch("qemu_driver.os.close"):
+            option = qemu_driver._drive_option(image.name)
+        self.assertTrue(option.endswith("format=qcow2,cache=none,aio=native"))
+
+
+    def test_img_suffix_stays_qcow2(self) -> None:
+        option = qemu_driver._drive_option("/nonexistent/acme.img")
+        self.assertEqual(option, "file=/nonexistent/acme.img,format=qcow2")
+
+    def test_backing_file_without_direct_io_keeps_host_cache(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            base = Path(tmpdir) / "base.qcow2"
+            base.write_bytes(b"QFI\xfb" + bytes(16))
+            overlay = Path(tmpdir) / "acme.qcow2"
+            name = b"base.qcow2"
+            overlay.write_bytes(b"QFI\xfb" + struct.pack(">IQI", 3, 64, len(name)) + bytes(44) + name)
+            self.assertEqual(qemu_driver._qcow2_backing_file(str(overlay)), str(base))
+
+            def fake_open(path, flags):
+                if path == str(base):
+                    raise OSError("O_DIRECT unsupported")
+                return 99
+
+            with mock.patch("qemu_driver.os.open", side_effect=fake_open), mock.patch(
+                "qemu_driver.os.close"
+            ):
+                option = qemu_driver._drive_option(str(overlay))
+        self.assertEqual(option, f"file={overlay},format=qcow2")
+
+
+if __name__ == "__main__":
+    unittest.main()
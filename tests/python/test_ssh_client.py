@@ -0,0 +1,43 @@
+"""Tests for the SSH helper module."""
+from __future__ import annotations
+
+import socket
+import sys
+import threading
+import unittest
+from pathlib import Path
+
+CLI_DIR = Path(__file__).resolve().parents[2] / "apps" / "cli"
+if str(CLI_DIR) not in sys.path:
+    sys.path.insert(0, str(CLI_DIR))
+
+from ssh_client import wait_for_ssh  # noqa: E402
+
+
+class WaitForSSHTests(unittest.TestCase):
+    def _serve_once(self, banner: bytes) -> int:
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen(1)
+        self.addCleanup(server.close)
+
+        def accept() -> None:
+            conn, _ = server.accept()
+            with conn:
+                conn.sendall(banner)
+
+        threading.Thread(target=accept, daemon=True).start()
+        return server.getsockname()[1]
+
+    def test_returns_once_banner_arrives(self) -> None:
+        port = self._serve_once(b"SSH-2.0-OpenSSH_9.6\r\n")
+        self.assertTrue(wait_for_ssh(port, timeout=5.0))
+
+    def test_accepting_socket_without_banner_is_not_ready(self) -> None:
+        # Mimics QEMU's forwarder accepting before the guest's sshd is up.
+        port = self._serve_once(b"")
+        self.assertFalse(wait_for_ssh(port, timeout=0.3, interval=0.05))
+
+
+if __name__ == "__main__":
+    unittest.main()
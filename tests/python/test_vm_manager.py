@@ -1,9 +1,14 @@
 """Unit tests for VMManager helper utilities."""
 from __future__ import annotations
 
+import errno
 import json
+import os
+import signal
+import subprocess
 import sys
 import tempfile
+import threading
 import unittest
 from pathlib import Path
 from typing import Dict, Optional
@@ -66,6 +71,96 @@ class VMManagerPortRangeTests(unittest.TestCase):
         self.assertEqual(ssh, self.manager.port_config["ssh"] + 2)
         self.assertEqual(test, self.manager.port_config["test"])
 
+    @mock.patch.object(VMManager, "_host_port_available", return_value=True)
+    def test_get_port_range_skips_ports_of_stopped_vms(self, _mock_available: mock.MagicMock) -> None:
+        """Ports recorded for an existing VM stay reserved even when unbound."""
+        defaults = self.manager.port_config
+        self.manager._save_vm_config(
+            "existing",
+            {
+                "name": "existing",
+                "image_path": "/tmp/existing.qcow2",
+                "ports": {key: defaults[key] for key in ("http", "https", "ssh", "test")},
+            },
+        )
+
+        http, https, ssh, test = VMManager(Path(self._tmpdir.name))._get_port_range()
+
+        self.assertEqual(http, defaults["http"] + 1)
+        self.assertEqual(https, defaults["https"] + 1)
+        self.assertEqual(ssh, defaults["ssh"] + 1)
+        self.assertEqual(test, defaults["test"] + 1)
+
+
+class VMManagerConfigCacheTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.manager = VMManager(Path(self._tmpdir.name))
+        self.config = {
+            "name": "acme",
+            "image_path": "/tmp/acme.qcow2",
+            "ports": {"http": 8081, "https": 8443, "ssh": 2224, "test": 8889},
+            "status": "stopped",
+        }
+        self.manager._save_vm_config("acme", self.config)
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_load_reuses_cached_config_when_unchanged(self) -> None:
+        """Repeat loads of an unchanged file should not re-read it."""
+        first = self.manager._load_vm_config("acme")
+        with mock.patch.object(Path, "read_bytes", side_effect=AssertionError("re-read")):
+            second = self.manager._load_vm_config("acme")
+        self.assertEqual(first, second)
+        # Callers mutate the returned dict; it must not leak into the cache.
+        second["status"] = "running"
+        self.assertEqual(self.manager._load_vm_config("acme")["status"], "stopped")
+
+    def test_load_picks_up_external_changes(self) -> None:
+        """A newer mtime on disk should invalidate the cached entry."""
+        self.manager._load_vm_config("acme")
+        config_path = self.manager._get_vm_config_path("acme")
+        updated = dict(self.config, status="running")
+        config_path.write_text(json.dumps(updated))
+        stat = config_path.stat()
+        os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        self.assertEqual(self.manager._load_vm_config("acme")["status"], "running")
+
+    def test_load_detects_same_mtime_rewrite(self) -> None:
+        """A rewrite that keeps the mtime but changes size is still picked up."""
+        self.manager._load_vm_config("acme")
+        config_path = self.manager._get_vm_config_path("acme")
+        stat = config_path.stat()
+        config_path.write_text(json.dumps(dict(self.config, status="running")))
+        os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(self.manager._load_vm_config("acme")["status"], "running")
+
+    def test_load_missing_config_returns_none(self) -> None:
+        self.manager._get_vm_config_path("acme").unlink()
+        self.assertIsNone(self.manager._load_vm_config("acme"))
+
+    def test_save_replaces_config_atomically(self) -> None:
+        config_path = self.manager._get_vm_config_path("acme")
+        with mock.patch("vm_manager.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.manager._save_vm_config("acme", dict(self.config, status="running"))
+        # A failed save must leave the previous config intact.
+        self.assertEqual(json.loads(config_path.read_text())["status"], "stopped")
+
+        self.manager._save_vm_config("acme", dict(self.config, status="running"))
+        self.assertEqual(json.loads(config_path.read_text())["status"], "running")
+        self.assertEqual(sorted(p.name for p in config_path.parent.iterdir()), ["acme.json"])
+
+    def test_prerequisites_probed_once(self) -> None:
+        probe = {"success": True, "missing": [], "warnings": []}
+        with mock.patch.object(
+            self.manager.platform, "check_prerequisites", return_value=probe
+        ) as mock_check:
+            self.manager.check_prerequisites()
+            self.assertIs(self.manager.check_prerequisites(), probe)
+        mock_check.assert_called_once_with()
+
 
 class VMManagerAgeKeyTests(unittest.TestCase):
     def setUp(self) -> None:
@@ -104,6 +199,95 @@ class VMManagerAgeKeyTests(unittest.TestCase):
         self.assertIn("guestfish", args[0][0])
 
 
+class VMManagerSSHTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workdir = Path(self._tmpdir.name)
+        self.manager = VMManager(self.workdir / "vms")
+        self.keypair = self.workdir / "id_ed25519"
+        self.keypair.write_text("PRIVATE")
+        self.manager._save_vm_config(
+            "acme",
+            {
+                "name": "acme",
+                "image_path": "/tmp/acme.qcow2",
+                "ports": {"http": 8081, "https": 8443, "ssh": 2224, "test": 8889},
+                "keypair": str(self.keypair),
+            },
+        )
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_ssh_vm_session_reuses_probe_connection(self) -> None:
+        probe = mock.Mock(returncode=0, stdout="", stderr="")
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=True), mock.patch(
+            "vm_manager.subprocess.run", return_value=probe
+        ) as run_mock, mock.patch("vm_manager.os.execvp") as exec_mock:
+            self.manager.ssh_vm("acme")
+
+        probe_cmd = run_mock.call_args_list[0][0][0]
+        program, session_cmd = exec_mock.call_args_list[0][0]
+        self.assertEqual(program, "ssh")
+        self.assertIn("ControlMaster=auto", probe_cmd)
+        self.assertEqual(probe_cmd[: len(session_cmd)], session_cmd)
+
+
+class VMManagerLogsTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.manager = VMManager(Path(self._tmpdir.name))
+        self.manager._save_vm_config(
+            "acme",
+            {
+                "name": "acme",
+                "image_path": "/tmp/acme.qcow2",
+                "ports": {"http": 8081, "https": 8443, "ssh": 2224, "test": 8889},
+                "keypair": str(Path(self._tmpdir.name) / "missing-key"),
+            },
+        )
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_get_logs_json_output_parses_entries(self) -> None:
+        stdout = '{"MESSAGE": "one"}\n\n{"MESSAGE": "two"}\n'
+        completed = mock.Mock(returncode=0, stdout=stdout, stderr="")
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=True), mock.patch(
+            "vm_manager.run_command", return_value=completed
+        ) as run_mock:
+            result = self.manager.get_logs("acme", service="nats", tail=5, json_output=True)
+
+        self.assertTrue(result["success"])
+        self.assertEqual([entry["MESSAGE"] for entry in result["entries"]], ["one", "two"])
+        command = run_mock.call_args[0][0]
+        self.assertIn("--output=json", command)
+        self.assertIn("--unit=nats.service", command)
+        self.assertIn("--lines=5", command)
+
+    def test_get_logs_rejects_json_output_with_follow(self) -> None:
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=True), mock.patch(
+            "vm_manager.os.execvp"
+        ) as exec_mock:
+            result = self.manager.get_logs("acme", follow=True, json_output=True)
+
+        self.assertFalse(result["success"])
+        self.assertIn("follow", result["error"])
+        exec_mock.assert_not_called()
+
+    def test_get_logs_message_format_follows_bare_messages(self) -> None:
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=True), mock.patch(
+            "vm_manager.os.execvp"
+        ) as exec_mock:
+            self.manager.get_logs("acme", follow=True, all_services=True, log_format="message")
+
+        command = exec_mock.call_args[0][1]
+        self.assertIn("--follow", command)
+        self.assertIn("--output=cat", command)
+        self.assertIn("--unit=traefik.service", command)
+        self.assertNotIn("-u", command)
+
+
 class VMManagerCreateTests(unittest.TestCase):
     def setUp(self) -> None:
         self._tmpdir = tempfile.TemporaryDirectory()
@@ -131,6 +315,7 @@ class VMManagerCreateTests(unittest.TestCase):
         build_success: bool = True,
         age_key: bool = True,
         skip_build: bool = False,
+        inject_at_build: bool = False,
         profile: str = "development",
         profile_attr: str = "development",
         custom_ports: Optional[Dict[str, int]] = None,
@@ -166,6 +351,7 @@ class VMManagerCreateTests(unittest.TestCase):
                 age_key_path=age_key_path,
                 custom_ports=port_overrides,
                 skip_build=skip_build,
+                inject_at_build=inject_at_build,
             )
 
         if skip_build:
@@ -181,7 +367,10 @@ class VMManagerCreateTests(unittest.TestCase):
         # Verify injected path matches target copy
         target = Path(data["image_path"])
         self.assertTrue(target.exists())
-        inject_mock.assert_called_once_with(str(target), mock.ANY)
+        if inject_at_build:
+            inject_mock.assert_called_once_with(str(target), mock.ANY)
+        else:
+            inject_mock.assert_not_called()
         if age_key:
             age_mock.assert_called_once()
         else:
@@ -223,6 +412,25 @@ class VMManagerCreateTests(unittest.TestCase):
         self.assertEqual(data["ports"]["postgres"], overrides["postgres"])
         self.assertEqual(data["ports"]["redis"], overrides["redis"])
 
+    def test_clone_image_uses_copy_file_range_without_reflink(self) -> None:
+        target = self.workdir / "clone.qcow2"
+        unsupported = OSError(errno.EOPNOTSUPP, "reflink unsupported")
+        with mock.patch("fcntl.ioctl", side_effect=unsupported):
+            method = self.manager._clone_image(self.default_image, target)
+        self.assertEqual(method, "copy_file_range")
+        self.assertEqual(target.read_bytes(), self.default_image.read_bytes())
+
+    def test_clone_image_falls_back_to_plain_copy(self) -> None:
+        target = self.workdir / "clone.qcow2"
+        with mock.patch(
+            "fcntl.ioctl", side_effect=OSError(errno.EOPNOTSUPP, "reflink unsupported")
+        ), mock.patch(
+            "provisioner.os.copy_file_range", side_effect=OSError(errno.EXDEV, "cross-device")
+        ):
+            method = self.manager._clone_image(self.default_image, target)
+        self.assertEqual(method, "copy")
+        self.assertEqual(target.read_bytes(), self.default_image.read_bytes())
+
     def test_create_vm_errors_when_no_image_available(self) -> None:
         # Remove default image to force failure when build fails
         self.default_image.unlink()
@@ -277,6 +485,280 @@ class VMManagerCreateTests(unittest.TestCase):
         self.assertFalse(secrets.get("age_key_installed"))
         self.assertEqual(secrets.get("age_key_embed_error"), "guestfish boom")
 
+    def test_create_vm_defers_key_injection_to_first_boot(self) -> None:
+        _, data = self._run_create()
+        self.assertFalse(data["inject_at_build"])
+        self.assertFalse(data["ssh_key_configured"])
+
+    def test_create_vm_injects_key_when_requested(self) -> None:
+        _, data = self._run_create(inject_at_build=True)
+        self.assertTrue(data["ssh_key_configured"])
+
+    def test_create_vms_assigns_distinct_ports(self) -> None:
+        specs = [
+            {
+                "company_name": name,
+                "keypair_path": str(self.private_key),
+                "profile": "development",
+                "profile_attr": "development",
+                "default_image_path": self.default_image,
+                "skip_build": True,
+            }
+            for name in ("acme", "globex")
+        ]
+        with mock.patch.object(VMManager, "_host_port_available", return_value=True):
+            results = self.manager.create_vms(specs, max_workers=2)
+
+        self.assertTrue(all(result["success"] for result in results.values()))
+        acme_ports = set(results["acme"]["config"]["ports"].values())
+        globex_ports = set(results["globex"]["config"]["ports"].values())
+        self.assertFalse(acme_ports & globex_ports)
+
+    def test_failed_create_releases_reserved_ports(self) -> None:
+        self.default_image.unlink()
+        with mock.patch.object(VMManager, "_host_port_available", return_value=True):
+            failed = self.manager.create_vm(
+                company_name="broken",
+                keypair_path=str(self.private_key),
+                profile="development",
+                profile_attr="development",
+                default_image_path=self.default_image,
+                skip_build=True,
+            )
+            self.default_image.write_bytes(b"default profile image")
+            created = self.manager.create_vm(
+                company_name="acme",
+                keypair_path=str(self.private_key),
+                profile="development",
+                profile_attr="development",
+                default_image_path=self.default_image,
+                skip_build=True,
+            )
+
+        self.assertFalse(failed["success"])
+        self.assertTrue(created["success"])
+        self.assertEqual(created["config"]["ports"]["http"], self.manager.port_config["http"])
+
+    def test_saving_new_ports_frees_the_old_ones(self) -> None:
+        with mock.patch.object(VMManager, "_host_port_available", return_value=True):
+            _, data = self._run_create(age_key=False)
+            old_http = data["ports"]["http"]
+            config = self.manager._load_vm_config("acme")
+            config["ports"]["http"] = old_http + 100
+            self.manager._save_vm_config("acme", config)
+            self.assertTrue(self.manager._port_available(old_http))
+            self.assertFalse(self.manager._port_available(old_http + 100))
+
+    def test_create_vms_clones_each_profile_build(self) -> None:
+        result_link = self.workdir / "result"
+        for attr in ("development", "dataPlane"):
+            store = self.workdir / f"store-{attr}"
+            store.mkdir()
+            (store / "nixos.qcow2").write_bytes(attr.encode())
+
+        def fake_build(_self, profile_attr, _pomerium=None):
+            if result_link.is_symlink():
+                result_link.unlink()
+            result_link.symlink_to(self.workdir / f"store-{profile_attr}")
+            return {"success": True, "image": result_link / "nixos.qcow2"}
+
+        # Hold both clones until both builds have repointed the result link.
+        both_built = threading.Barrier(2, timeout=10)
+        real_clone = VMManager._clone_image
+
+        def gated_clone(_self, source, target):
+            both_built.wait()
+            return real_clone(_self, source, target)
+
+        specs = [
+            {
+                "company_name": name,
+                "keypair_path": str(self.private_key),
+                "profile": attr,
+                "profile_attr": attr,
+                "default_image_path": self.default_image,
+            }
+            for name, attr in (("acme", "development"), ("globex", "dataPlane"))
+        ]
+        with mock.patch.object(VMManager, "_host_port_available", return_value=True), \
+                mock.patch.object(VMManager, "_build_vm_image", fake_build), \
+                mock.patch.object(VMManager, "_clone_image", gated_clone):
+            results = self.manager.create_vms(specs, max_workers=2)
+
+        for name, attr in (("acme", "development"), ("globex", "dataPlane")):
+            config = results[name]["config"]
+            self.assertEqual(
+                config["base_image"],
+                str((self.workdir / f"store-{attr}" / "nixos.qcow2").resolve()),
+            )
+            self.assertEqual(Path(config["image_path"]).read_bytes(), attr.encode())
+
+    def test_create_vm_records_base_image(self) -> None:
+        _, data = self._run_create(build_success=False, age_key=False)
+        self.assertEqual(data["base_image"], str(self.default_image.resolve()))
+
+
+class VMManagerLifecycleTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workdir = Path(self._tmpdir.name)
+        self.manager = VMManager(self.workdir / "vms")
+        self.manager.platform.get_temp_dir = mock.Mock(return_value=self.workdir)
+        self.manager._save_vm_config(
+            "acme",
+            {
+                "name": "acme",
+                "image_path": "/tmp/acme.qcow2",
+                "ports": {"http": 8081, "https": 8443, "ssh": 2224, "test": 8889},
+                "status": "running",
+            },
+        )
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_stop_signals_pid_from_pidfile(self) -> None:
+        proc = subprocess.Popen(["sleep", "30"])
+        self.addCleanup(proc.wait)
+        self.manager._get_pidfile_path("acme").write_text(f"{proc.pid}\n")
+        self.assertTrue(self.manager._is_vm_running("acme"))
+
+        # Reap the child as soon as it exits, as init does for daemonized QEMU.
+        reaper = threading.Thread(target=proc.wait)
+        reaper.start()
+        with mock.patch("vm_manager.subprocess.run") as run_mock:
+            result = self.manager.stop_vm("acme")
+        reaper.join()
+
+        self.assertTrue(result["success"])
+        run_mock.assert_not_called()
+        self.assertEqual(proc.wait(timeout=5), -signal.SIGTERM)
+        self.assertFalse(self.manager._get_pidfile_path("acme").exists())
+        self.assertEqual(self.manager._load_vm_config("acme")["status"], "stopped")
+
+    def test_start_many_runs_starts_concurrently(self) -> None:
+        barrier = threading.Barrier(2, timeout=5)
+
+        def fake_start(_self: VMManager, name: str) -> dict:
+            barrier.wait()  # deadlocks unless both starts overlap
+            if name == "broken":
+                raise RuntimeError("qemu missing")
+            return {"success": True}
+
+        with mock.patch.object(VMManager, "start_vm", new=fake_start):
+            results = self.manager.start_many(["acme", "broken"])
+
+        self.assertEqual(results["acme"], {"success": True})
+        self.assertEqual(results["broken"], {"success": False, "error": "qemu missing"})
+
+    def test_status_all_vms_reads_pidfiles_without_subprocesses(self) -> None:
+        self.manager._save_vm_config(
+            "globex",
+            {
+                "name": "globex",
+                "image_path": "/tmp/globex.qcow2",
+                "ports": {"http": 8082, "https": 8444, "ssh": 2225, "test": 8890},
+            },
+        )
+        self.manager._get_pidfile_path("acme").write_text(str(os.getpid()))
+        # Stale pidfiles for missing VMs are ignored.
+        self.manager._get_pidfile_path("ghost").write_text(str(os.getpid()))
+
+        with mock.patch("vm_manager.subprocess.run") as run_mock:
+            results = self.manager.status_all_vms()
+
+        run_mock.assert_not_called()
+        self.assertEqual(
+            results,
+            {
+                "acme": {"running": True, "status": "running"},
+                "globex": {"running": False, "status": "stopped"},
+            },
+        )
+
+    def test_stop_finds_qemu_by_pidfile_argument_when_pidfile_missing(self) -> None:
+        pidfile = self.manager._get_pidfile_path("acme")
+        proc = subprocess.Popen(
+            [sys.executable, "-c", "import time; time.sleep(30)", "-pidfile", str(pidfile)]
+        )
+        self.addCleanup(proc.wait)
+        reaper = threading.Thread(target=proc.wait)
+        reaper.start()
+
+        result = self.manager.stop_vm("acme")
+        reaper.join()
+
+        self.assertTrue(result["success"])
+        self.assertEqual(proc.wait(timeout=5), -signal.SIGTERM)
+
+    def test_is_vm_running_ignores_garbage_pidfile(self) -> None:
+        self.manager._get_pidfile_path("acme").write_text("not-a-pid")
+        self.assertFalse(self.manager._is_vm_running("acme"))
+
+
+class VMManagerResetTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.workdir = Path(self._tmpdir.name)
+        self.manager = VMManager(self.workdir / "vms")
+        self.base_image = self.workdir / "base.qcow2"
+        self.base_image.write_bytes(b"base")
+        self.image = self.workdir / "acme.qcow2"
+        self.image.write_bytes(b"dirty")
+        self.manager._save_vm_config(
+            "acme",
+            {
+                "name": "acme",
+                "image_path": str(self.image),
+                "base_image": str(self.base_image),
+                "ports": {"http": 8081, "https": 8443, "ssh": 2224, "test": 8889},
+            },
+        )
+
+    def tearDown(self) -> None:
+        self._tmpdir.cleanup()
+
+    def test_reset_creates_overlay_on_base_image(self) -> None:
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=False), mock.patch.object(
+            VMManager, "_build_vm_image"
+        ) as build_mock, mock.patch(
+            "vm_manager.shutil.which", return_value="/usr/bin/qemu-img"
+        ), mock.patch(
+            "vm_manager.subprocess.run",
+            side_effect=lambda cmd, **_: self.image.write_bytes(b"overlay"),
+        ) as run_mock:
+            result = self.manager.reset_vm("acme")
+
+        self.assertTrue(result["success"])
+        build_mock.assert_not_called()
+        command = run_mock.call_args[0][0]
+        self.assertEqual(command[:2], ["/usr/bin/qemu-img", "create"])
+        self.assertIn(str(self.base_image.resolve()), command)
+        self.assertEqual(command[-1], str(self.image))
+
+    def _reset_with_key(self, **extra) -> tuple[dict, mock.MagicMock]:
+        config = self.manager._load_vm_config("acme")
+        config.update(ssh_public_key="ssh-ed25519 AAAATEST", ssh_key_configured=True, **extra)
+        self.manager._save_vm_config("acme", config)
+        with mock.patch.object(VMManager, "_is_vm_running", return_value=False), mock.patch.object(
+            VMManager, "_create_overlay_disk", return_value={"success": True}
+        ), mock.patch.object(
+            VMManager, "_inject_ssh_key", return_value={"success": True}
+        ) as inject_mock:
+            result = self.manager.reset_vm("acme")
+        self.assertTrue(result["success"])
+        return self.manager._load_vm_config("acme"), inject_mock
+
+    def test_reset_defers_key_to_first_boot(self) -> None:
+        config, inject_mock = self._reset_with_key()
+        inject_mock.assert_not_called()
+        self.assertFalse(config["ssh_key_configured"])
+
+    def test_reset_reinjects_key_when_injected_at_build(self) -> None:
+        config, inject_mock = self._reset_with_key(inject_at_build=True)
+        inject_mock.assert_called_once_with(str(self.image), "ssh-ed25519 AAAATEST")
+        self.assertTrue(config["ssh_key_configured"])
+
 
 if __name__ == "__main__":
     unittest.main()